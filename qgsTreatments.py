@@ -32,11 +32,19 @@ from qgis.core import (Qgis,
                        QgsProperty,
                        QgsFeature,
                        QgsFeatureRequest,
+                       QgsFeatureSink,
                        QgsField,
                        QgsProcessingContext,
+                       QgsProcessingMultiStepFeedback,
                        QgsVectorLayer,
                        QgsRasterLayer,
+                       QgsRectangle,
+                       QgsCoordinateReferenceSystem,
+                       QgsMapLayer,
                        QgsExpression,
+                       QgsExpressionContext,
+                       QgsExpressionContextUtils,
+                       NULL,
                        QgsTask,
                        QgsUnitTypes)
 from PyQt5.QtCore import QVariant
@@ -45,8 +53,24 @@ from PyQt5.QtGui import QGuiApplication
 import shutil
 import os.path
 import sys
+import re
+import uuid
+import math
 import subprocess
 import time
+import functools
+import itertools
+import threading
+import collections
+import concurrent.futures
+import importlib.util
+import contextlib
+import numpy as np
+
+try:
+    from osgeo import gdal, gdal_array
+except ImportError:
+    import gdal, gdal_array
 
 import processing
 
@@ -56,13 +80,62 @@ nodata_val = '-9999'
 MEMORY_LAYER_NAME = 'memory:'
 GTIFF_COPT = qgsUtils.GTIFF_COPT
 
+# Module settings used by treatments, part of memoization keys (utils.memoizeFile)
+def memoSettings():
+    return (nodata_val, GTIFF_COPT, qgsUtils.GTIFF_COPT)
+
 gdal_calc_cmd = None
 gdal_merge_cmd = None
 gdal_rasterize_cmd = None
 gdal_warp_cmd = None
 
+# Returns True if osgeo_utils.gdal_calc module (GDAL >= 3.2) can be run by
+# current interpreter (inside QGIS, sys.executable may be QGIS binary)
+@functools.lru_cache(maxsize=1)
+def gdalCalcModuleOk():
+    exe = os.path.basename(sys.executable).lower()
+    if not exe.startswith("python"):
+        return False
+    try:
+        return importlib.util.find_spec("osgeo_utils.gdal_calc") is not None
+    except ImportError:
+        return False
+
+# Returns gdal_calc command line prefix : gdal_calc_cmd if set, else module
+# run by current interpreter (no .bat wrapper nor interpreter lookup),
+# else gdal_calc script
+def getGdalCalcCmd():
+    if gdal_calc_cmd:
+        return [gdal_calc_cmd]
+    if gdalCalcModuleOk():
+        return [sys.executable, '-m', 'osgeo_utils.gdal_calc']
+    return ['gdal_calc.bat' if utils.platform_sys == 'Windows' else 'gdal_calc.py']
+
 # Processing call wrappers      
-  
+
+# If True, parameters and results of processing calls are pushed as debug info
+# (stringifying them is costly for scripts calling many small algorithms)
+processing_debug = False
+# If True, Qt events are processed before each processing call. Not needed
+# with plugin feedbacks that already process events on progress updates.
+gui_mode = False
+
+# Replaces layer ids of results 'res' that are layers of 'context' temporary
+# store (memory or TEMPORARY_OUTPUT outputs) by the layers, taken out of
+# context (as processing.run does without onFinish) so that they are not
+# deleted with context.
+def takeResultLayers(res,context):
+    if not isinstance(res,dict):
+        return res
+    store = context.temporaryLayerStore()
+    for k, v in res.items():
+        if isinstance(v,str) and store.mapLayer(v) is not None:
+            res[k] = context.takeResultLayer(v)
+    return res
+    
+# Calls without context run in a new context. A context is cheap to build,
+# and reusing one (e.g. per thread) would keep input layers loaded between
+# calls : their files would stay locked and their later rewrites hidden.
 def applyProcessingAlg(provider,alg_name,parameters,context=None,
         feedback=None,onlyOutput=True):
     # Dummy function to enable running an alg inside an alg
@@ -70,33 +143,39 @@ def applyProcessingAlg(provider,alg_name,parameters,context=None,
         pass
     if feedback is None:
         utils.internal_error("No feedback")
-    feedback.pushDebugInfo("parameters : " + str(parameters))
-    QGuiApplication.processEvents()
+    if processing_debug:
+        feedback.pushDebugInfo("parameters : " + str(parameters))
+    if gui_mode:
+        QGuiApplication.processEvents()
+    # Cached datasets must not lock a raster output about to be rewritten
+    if isinstance(parameters.get('OUTPUT',parameters.get('output')),str):
+        qgsUtils.clearRasterCache()
+    own_context = False
     try:
         complete_name = provider + ":" + alg_name
         feedback.pushInfo("Calling processing algorithm '" + complete_name + "'")
         start_time = time.time()
-        context = None
-        #utils.debug("context = " + str(context))
+        # Caller context is kept (temporary layers store, project, ...)
         if context is None:
             context = QgsProcessingContext()
             context.setFeedback(feedback)
-        feedback.pushDebugInfo("complete_name = " + str(complete_name))
-        feedback.pushDebugInfo("feedback = " + str(feedback.__class__.__name__))
-        # assert(False)
+            own_context = True
+        if processing_debug:
+            feedback.pushDebugInfo("complete_name = " + str(complete_name))
+            feedback.pushDebugInfo("feedback = " + str(feedback.__class__.__name__))
         res = processing.run(complete_name,parameters,onFinish=no_post_process,context=context,feedback=feedback)
+        if own_context:
+            res = takeResultLayers(res,context)
         #res = processing.runAndLoadResults(complete_name,parameters,context=context,feedback=feedback)#,onFinish=no_post_process)
-        feedback.pushDebugInfo("res1 = " + str(res))
         end_time = time.time()
         diff_time = end_time - start_time
         feedback.pushInfo("Call to " + alg_name + " successful"
                     + ", performed in " + str(diff_time) + " seconds")
         # feedback.endJob()
-        feedback.pushDebugInfo("res = " + str(res))
+        if processing_debug:
+            feedback.pushDebugInfo("res = " + str(res))
         if onlyOutput:
             if "OUTPUT" in res:
-                feedback.pushDebugInfo("output = " + str(res["OUTPUT"]))
-                feedback.pushDebugInfo("output type = " + str(type(res["OUTPUT"])))
                 return res["OUTPUT"]
             elif 'output' in res:
                 return res['output']
@@ -108,7 +187,8 @@ def applyProcessingAlg(provider,alg_name,parameters,context=None,
         feedback.pushWarning ("Failed to call " + alg_name + " : " + str(e))
         raise e
     finally:  
-        feedback.pushDebugInfo("End run " + alg_name)
+        if processing_debug:
+            feedback.pushDebugInfo("End run " + alg_name)
         
 # class ProcessingAlgTask(QgsTask):
 
@@ -160,10 +240,30 @@ def checkGrass7Installed():
 def applyGrassAlg(alg_name,parameters,context,feedback):
     checkGrass7Installed()
     return applyProcessingAlg("grass7",alg_name,parameters,context,feedback)
+    
+# Runs GRASS algorithms 'specs' ([(alg_name, parameters), ...]) and returns
+# list of outputs. GRASS installation is checked once for the whole batch and
+# progress is reported per algorithm.
+# Calls are sequential : GRASS provider shares a single session mapset and
+# batch job file, concurrent runs (threads or processes) would overwrite
+# each other.
+def applyGrassAlgBatch(specs,context=None,feedback=None):
+    checkGrass7Installed()
+    step_feedback = QgsProcessingMultiStepFeedback(len(specs),feedback)
+    res = []
+    for cpt, (alg_name, parameters) in enumerate(specs):
+        step_feedback.setCurrentStep(cpt)
+        if step_feedback.isCanceled():
+            break
+        res.append(applyProcessingAlg("grass7",alg_name,parameters,
+            context,step_feedback))
+    return res
 
 # Types normalization
 
 USE_INPUT_TYPE = -1
+# Largest data type of inputs (gdal_calc default), only known by applyBlockCalc
+USE_LARGEST_TYPE = -2
 
 # QGIS type converted to integer to be passed as a processing alg parameter
 # Parameter shift return integer value according to TYPES list
@@ -195,6 +295,8 @@ def qgsTypeToInt(qgis_type,shift=False,typeList=2,defaultType=Qgis.Float32):
             return int_value
         else:
             utils.internal_error("No type associated to qgis type " + str(qgis_type))
+    elif qgis_type == USE_LARGEST_TYPE:
+        return qgsTypeToInt(defaultType,shift=shift,typeList=typeList)
     elif isinstance(qgis_type,int):
         int_value = 0 if qgis_type == USE_INPUT_TYPE else qgis_type
         return int_value
@@ -203,43 +305,127 @@ def qgsTypeToInt(qgis_type,shift=False,typeList=2,defaultType=Qgis.Float32):
 
 # Custom treatments
 
-def selectGeomByExpression(in_layer,expr,out_path,out_name):
+# Number of features sent to data provider in a single call
+FEATURES_BATCH_SIZE = 10000
+
+# Adds features of list 'buf' to 'provider' in a single call and empties 'buf'
+def addFeaturesBatch(provider,buf):
+    if not buf:
+        return
+    res = provider.addFeatures(buf,QgsFeatureSink.FastInsert)
+    if not res or not res[0]:
+        utils.internal_error("addFeatures failed : " + str(provider.lastError()))
+    buf.clear()
+    
+# Adds features yielded by 'feats' to 'provider' by batches of
+# FEATURES_BATCH_SIZE (FastInsert : no feature ids update, no per-feature signals)
+def addFeaturesFromIter(provider,feats):
+    feats = iter(feats)
+    buf = list(itertools.islice(feats,FEATURES_BATCH_SIZE))
+    while buf:
+        addFeaturesBatch(provider,buf)
+        buf.extend(itertools.islice(feats,FEATURES_BATCH_SIZE))
+
+# Parsed expressions, bounded so that long sessions do not accumulate them.
+# Returned objects are shared : use a copy (QgsExpression(e)) before prepare.
+@functools.lru_cache(maxsize=256)
+def getCompiledExpression(expr):
+    qexpr = QgsExpression(expr)
+    if qexpr.hasParserError():
+        utils.user_error("Invalid expression '" + str(expr) + "' : "
+            + qexpr.parserErrorString())
+    return qexpr
+
+# If True, selectGeomByExpression runs native algorithms (extraction and
+# fields refactoring), otherwise features are copied in Python
+select_geom_native = False
+
+# Output layer is written to 'out_path' (and path is returned). If 'out_path'
+# is None, memory layer is returned instead, to be given directly as input
+# of another treatment without writing it to disk.
+def selectGeomByExpression(in_layer,expr,out_path=None,out_name=None,
+        context=None,feedback=None):
     #utils.info("Calling 'selectGeomByExpression' algorithm")
     start_time = time.time()
-    qgsUtils.removeVectorLayer(out_path)
+    if out_path:
+        qgsUtils.removeVectorLayer(out_path)
     if isinstance(in_layer,str):
         in_layer = qgsUtils.loadVectorLayer(in_layer)
+    if not out_name:
+        out_name = in_layer.name()
+    if select_geom_native:
+        if feedback is None:
+            feedback = QgsProcessingFeedback()
+        return selectGeomByExpressionNative(in_layer,expr,out_path,out_name,
+            context=context,feedback=feedback)
     out_layer = qgsUtils.createLayerFromExisting(in_layer,out_name)
     orig_field = QgsField("Origin", QVariant.String)
     out_layer.dataProvider().addAttributes([orig_field])
     out_layer.updateFields()
     fields = out_layer.fields()
     out_provider = out_layer.dataProvider()
-    in_name = in_layer.name()
+    # Attributes list is built once and copied by setAttributes
+    attrs = [in_layer.name()]
+    # Only geometries are copied, provider reads no attribute except
+    # the ones referenced by filter expression (added by QGIS)
+    request = QgsFeatureRequest().setSubsetOfAttributes([])
     if expr:
-        feats = in_layer.getFeatures(QgsFeatureRequest().setFilterExpression(expr))
-    else:
-        feats = in_layer.getFeatures(QgsFeatureRequest())
-    for f in feats:
-        geom = f.geometry()
-        new_f = QgsFeature(fields)
-        new_f.setGeometry(geom)
-        new_f["Origin"] = in_layer.name()
-        res = out_provider.addFeature(new_f)
-        if not res:
-            internal_error("addFeature failed")
+        request.setFilterExpression(expr)
+    feats = in_layer.getFeatures(request)
+    def newFeatures():
+        for f in feats:
+            new_f = QgsFeature(fields)
+            new_f.setGeometry(f.geometry())
+            new_f.setAttributes(attrs)
+            yield new_f
+    addFeaturesFromIter(out_provider,newFeatures())
     out_layer.updateExtents()
-    qgsUtils.writeVectorLayer(out_layer,out_path)
     end_time = time.time()
     diff_time = end_time - start_time
     #utils.info("Call to 'selectGeomByExpression' successful"
     #           + ", performed in " + str(diff_time) + " seconds")
-    
-def classifByExpr(in_layer,expr,out_path,out_name):
+    if not out_path:
+        return out_layer
+    qgsUtils.writeVectorLayer(out_layer,out_path)
+    return out_path
+    
+# Native version of selectGeomByExpression : selected features are extracted
+# and 'Origin' field replaces input fields, features are not copied in Python.
+# Both algorithms run in the same context (extracted temporary layer must
+# live until fields are refactored). Memory output layer is taken out of
+# context and returned, as with Python version.
+def selectGeomByExpressionNative(in_layer,expr,out_path,out_name,context=None,feedback=None):
+    if context is None:
+        context = QgsProcessingContext()
+        context.setFeedback(feedback)
+    if expr:
+        selected = extractByExpression(in_layer,expr,'TEMPORARY_OUTPUT',
+            context=context,feedback=feedback)
+    else:
+        selected = in_layer
+    mapping = [{ 'expression' : QgsExpression.quotedString(in_layer.name()),
+                 'length' : 0,
+                 'name' : 'Origin',
+                 'precision' : 0,
+                 'type' : QVariant.String }]
+    parameters = { 'FIELDS_MAPPING' : mapping,
+                   'INPUT' : selected,
+                   'OUTPUT' : out_path if out_path else MEMORY_LAYER_NAME + out_name }
+    res = applyProcessingAlg("native","refactorfields",parameters,context,feedback)
+    if out_path:
+        return res
+    return context.takeResultLayer(res)
+    
+# Same output convention as selectGeomByExpression ('out_path' None
+# returns memory layer)
+def classifByExpr(in_layer,expr,out_path=None,out_name=None):
     #utils.info("Calling 'selectGeomByExpression' algorithm")
-    qgsUtils.removeVectorLayer(out_path)
+    if out_path:
+        qgsUtils.removeVectorLayer(out_path)
     if isinstance(in_layer,str):
         in_layer = qgsUtils.loadVectorLayer(in_layer)
+    if not out_name:
+        out_name = in_layer.name()
     out_layer = qgsUtils.createLayerFromExisting(in_layer,out_name)
     value_field = QgsField("Value", QVariant.Int)
     orig_field = QgsField("Origin", QVariant.String)
@@ -247,34 +433,43 @@ def classifByExpr(in_layer,expr,out_path,out_name):
     out_layer.updateFields()
     fields = out_layer.fields()
     out_provider = out_layer.dataProvider()
-    in_name = in_layer.name()
+    # Attributes list is built once and copied by setAttributes,
+    # only value (first attribute) is updated for each feature
+    attrs = [1, in_layer.name()]
+    # Expression is parsed once per session and prepared once, then evaluated
+    # in a single pass (features where it evaluates to NULL are skipped,
+    # as with NOT(expr) filter)
     if expr:
-        feats = in_layer.getFeatures(QgsFeatureRequest().setFilterExpression(expr))
+        qexpr = QgsExpression(getCompiledExpression(expr))
+        ctx = QgsExpressionContext()
+        ctx.appendScopes(QgsExpressionContextUtils.globalProjectLayerScopes(in_layer))
+        qexpr.prepare(ctx)
     else:
-        feats = in_layer.getFeatures(QgsFeatureRequest())
-    for f in feats:
-        geom = f.geometry()
-        new_f = QgsFeature(fields)
-        new_f.setGeometry(geom)
-        new_f["Value"] = 1
-        new_f["Origin"] = in_layer.name()
-        res = out_provider.addFeature(new_f)
-        if not res:
-            internal_error("addFeature failed")
-    if expr:
-        not_expr = "NOT(" + str(expr) + ")"
-        feats = in_layer.getFeatures(QgsFeatureRequest().setFilterExpression(not_expr))
-        for f in feats:
-            geom = f.geometry()
+        qexpr = None
+    # Provider only reads attributes referenced by expression
+    request = QgsFeatureRequest()
+    if qexpr is None:
+        request.setSubsetOfAttributes([])
+    elif QgsFeatureRequest.ALL_ATTRIBUTES not in qexpr.referencedColumns():
+        request.setSubsetOfAttributes(qexpr.referencedColumns(),in_layer.fields())
+    def newFeatures():
+        for f in in_layer.getFeatures(request):
+            if qexpr is not None:
+                ctx.setFeature(f)
+                res = qexpr.evaluate(ctx)
+                if res is None or res == NULL:
+                    continue
+                attrs[0] = 1 if res else 0
             new_f = QgsFeature(fields)
-            new_f.setGeometry(geom)
-            new_f["Value"] = 0
-            new_f["Origin"] = in_layer.name()
-            res = out_provider.addFeature(new_f)
-            if not res:
-                internal_error("addFeature failed")
+            new_f.setGeometry(f.geometry())
+            new_f.setAttributes(attrs)
+            yield new_f
+    addFeaturesFromIter(out_provider,newFeatures())
     out_layer.updateExtents()
+    if not out_path:
+        return out_layer
     qgsUtils.writeVectorLayer(out_layer,out_path)
+    return out_path
 
 # Processing utils
 
@@ -639,24 +834,26 @@ def getRasterUniqueValsReport(input,context=None,feedback=None):
                              context=context,feedback=feedback,onlyOutput=False)
     return ret
 
+# Returns unique values of first band of raster file 'path' (nodata excluded).
+# Values of the last rasters are cached, keyed by (path, modification time)
+# so that a rewritten file is read again.
+@functools.lru_cache(maxsize=16)
+def rasterUniqueValsCached(path,mtime):
+    band = qgsUtils.openRaster(path).GetRasterBand(1)
+    return tuple(qgsUtils.bandUniqueVals(band).tolist())
+
+# Returns sorted list of unique values (nodata excluded) of first band of 'input'.
+# Raster is read block by block, result is cached until file is modified.
 def getRasterUniqueVals(input,feedback):
-    feedback.pushDebugInfo("HEY")
-    report = getRasterUniqueValsReport(input,feedback=feedback)
-    if isinstance(input,str):
-        input = qgsUtils.loadRasterLayer(input)
-    input_type = input.dataProvider().dataType(1)
-    tmp_table = report['OUTPUT_TABLE']
-    tmp_html = report['OUTPUT_HTML_FILE']
-    table_lyr = qgsUtils.loadVectorLayer(tmp_table)
-    unique_vals = qgsUtils.getVectorVals(table_lyr,'value')
-    feedback.pushDebugInfo("unique_vals = " + str(unique_vals))
-    feedback.pushDebugInfo("data_type = " + str(input_type))
-    if qgsUtils.qgisTypeIsInteger(input_type):
-        feedback.pushDebugInfo("data_type = " + str(input_type))
-        unique_vals = [int(v) for v in unique_vals]
+    path = rasterInputPath(input)
+    if os.path.isfile(path):
+        unique_vals = rasterUniqueValsCached(path,os.path.getmtime(path))
+    else:
+        band = qgsUtils.openRaster(path).GetRasterBand(1)
+        unique_vals = qgsUtils.bandUniqueVals(band).tolist()
     feedback.pushDebugInfo("unique_vals = " + str(unique_vals))
     feedback.setProgress(100)
-    return unique_vals
+    return list(unique_vals)
     
 def rasterZonalStats(vector,raster,output,prefix='_',band=1,stats=[0,1,2],context=None,feedback=None):
     parameters = { 'COLUMN_PREFIX' : prefix,
@@ -726,13 +923,33 @@ def applyHeatmap(input, output, resolution=5, radius_field=None,
 def applyRasterization(in_path,out_path,extent,resolution,
                        field=None,burn_val=None,out_type=Qgis.Float32,
                        nodata_val=nodata_val,all_touch=False,overwrite=False,
-                       context=None,feedback=None,options='|'.join(GTIFF_COPT)):
+                       context=None,feedback=None,options=None):
     TYPES = ['Byte', 'Int16', 'UInt16', 'UInt32', 'Int32', 'Float32',
              'Float64', Qgis.CInt16, Qgis.CInt32, 'CFloat32', 'CFloat64']
     #utils.debug("applyRasterization")
     feedback.setProgressText("Rasterize")
+    if options is None:
+        options = '|'.join(qgsUtils.getGTiffOptions(out_type))
     if overwrite:
         qgsUtils.removeRaster(out_path)
+    in_file = gdalInputPath(in_path)
+    gdal_extent = gdalExtent(extent)
+    # Extent CRS may differ from input CRS, let processing handle it
+    if (gdal_direct and in_file and gdalOutputPathOk(out_path) and resolution
+            and gdal_extent is not None and gdal_extent[1] is None):
+        rasterize_args = {}
+        if field:
+            rasterize_args['attribute'] = field
+        else:
+            rasterize_args['burnValues'] = [0 if burn_val is None else float(burn_val)]
+        gdal_options = gdal.RasterizeOptions(format='GTiff',
+            outputType=gdalType(out_type),
+            creationOptions=options.split('|') if options else None,
+            noData=gdalNodata(nodata_val),
+            xRes=float(resolution),yRes=float(resolution),
+            outputBounds=gdal_extent[0],allTouched=all_touch,
+            callback=gdalProgress(feedback),**rasterize_args)
+        return gdalCall(gdal.Rasterize,out_path,in_file,gdal_options)
     parameters = { 'ALL_TOUCH' : all_touch,
                    'BURN' : burn_val,
                    'DATA_TYPE' : qgsTypeToInt(out_type,shift=True),
@@ -769,7 +986,8 @@ def applyRasterizeOver(input_layer, input_raster, field, add=True, context=None,
 def applyWarpReproject(in_path,out_path,resampling_mode='near',dst_crs=None,
                        src_crs=None,extent=None,extent_crs=None,
                        resolution=None,out_type=USE_INPUT_TYPE,nodata_val=nodata_val,
-                       overwrite=False,context=None,feedback=None):
+                       overwrite=False,num_threads='ALL_CPUS',warp_mem_mb=256,
+                       context=None,feedback=None):
     feedback.setProgressText("Warp")
     modes = ['near', 'bilinear', 'cubic', 'cubicspline', 'lanczos',
              'average','mode', 'max', 'min', 'med', 'q1', 'q3']
@@ -782,23 +1000,53 @@ def applyWarpReproject(in_path,out_path,resampling_mode='near',dst_crs=None,
     # Output type
     TYPES = ['Use input layer data type', 'Byte', 'Int16', 'UInt16', 'UInt32', 'Int32',
              'Float32', 'Float64', Qgis.CInt16, Qgis.CInt32, 'CFloat32', 'CFloat64']
+    in_file = gdalInputPath(in_path)
+    gdal_extent = gdalExtent(extent,extent_crs)
+    if (gdal_direct and in_file and gdalOutputPathOk(out_path)
+            and gdal_extent is not None):
+        gdal_options = gdal.WarpOptions(format='GTiff',
+            srcSRS=gdalCrs(src_crs),dstSRS=gdalCrs(dst_crs),
+            outputBounds=gdal_extent[0],outputBoundsSRS=gdal_extent[1],
+            xRes=resolution,yRes=resolution,resampleAlg=resampling_mode,
+            outputType=gdalType(out_type),dstNodata=gdalNodata(nodata_val),
+            multithread=True,warpMemoryLimit=warp_mem_mb,
+            warpOptions=['NUM_THREADS=' + str(num_threads),'SKIP_NOSOURCE=YES'],
+            creationOptions=qgsUtils.getGTiffOptions(out_type),
+            callback=gdalProgress(feedback))
+        return gdalCall(gdal.Warp,out_path,in_file,gdal_options)
     # Parameters
     parameters = { 'DATA_TYPE' : qgsTypeToInt(out_type),
                    'INPUT' : in_path,
                    'NODATA' : nodata_val,
                    'OUTPUT' : out_path,
-                   'OPTIONS' : '|'.join(GTIFF_COPT),
+                   'OPTIONS' : '|'.join(qgsUtils.getGTiffOptions(out_type)),
                    'RESAMPLING' : mode_val,
                    'SOURCE_CRS' : src_crs,
                    'TARGET_CRS' : dst_crs,
                    'TARGET_EXTENT' : extent,
                    'TARGET_EXTENT_CRS' : extent_crs,
                    'TARGET_RESOLUTION' : resolution }
+    # Multithreaded warp on all cores, bounded warp memory (in MB),
+    # destination chunks without source data are skipped
+    parameters['MULTITHREADING'] = True
+    parameters['EXTRA'] = ('-wo NUM_THREADS=' + str(num_threads)
+        + ' -wo SKIP_NOSOURCE=YES -wm ' + str(warp_mem_mb)
+        + ' --config GDAL_CACHEMAX 512')
     return applyProcessingAlg("gdal","warpreproject",parameters,context,feedback)
     
 def applyTranslate(in_path,out_path,data_type=USE_INPUT_TYPE,nodata_val=nodata_val,
-                   crs=None,options='|'.join(GTIFF_COPT),context=None,feedback=None):
+                   crs=None,options=None,context=None,feedback=None):
     feedback.setProgressText("Tanslate")
+    if options is None:
+        options = '|'.join(qgsUtils.getGTiffOptions(data_type)
+                           + ["COPY_SRC_OVERVIEWS=YES"])
+    in_file = gdalInputPath(in_path)
+    if gdal_direct and in_file and gdalOutputPathOk(out_path):
+        gdal_options = gdal.TranslateOptions(format='GTiff',
+            outputType=gdalType(data_type),noData=gdalNodata(nodata_val),
+            creationOptions=options.split('|') if options else None,
+            callback=gdalProgress(feedback))
+        return gdalCall(gdal.Translate,out_path,in_file,gdal_options)
     # data type 0 = input raster type
     parameters = { 'COPY_SUBDATASETS' : False,
                    'DATA_TYPE' : qgsTypeToInt(data_type),
@@ -823,7 +1071,7 @@ def clipRasterFromVector(raster_path,vector_path,out_path,
                    'KEEP_RESOLUTION' : keep_res,
                    'MASK' : vector_path,
                    'NODATA' : nodata,
-                   'OPTIONS' : '|'.join(GTIFF_COPT),
+                   'OPTIONS' : '|'.join(qgsUtils.getGTiffOptions(data_type)),
                    'OUTPUT' : out_path }
     if resolution:
         parameters['KEEP_RESOLUTION'] = False
@@ -856,7 +1104,7 @@ def clipRasterAllTouched(raster_path,vector_path,dst_crs,
                    'RESAMPLING' : 0,
                    'TARGET_CRS' : dst_crs,
                    'TARGET_RESOLUTION' : resolution,
-                   'OPTIONS' : '|'.join(GTIFF_COPT),
+                   'OPTIONS' : '|'.join(qgsUtils.getGTiffOptions(data_type)),
                    'EXTRA' : extra_params }
     return applyProcessingAlg("gdal","warpreproject",parameters,context,feedback)
     
@@ -866,18 +1114,48 @@ def applyMergeRaster(files,output,nodata_val=nodata_val,out_type=Qgis.Float32,
                      nodata_input=None,pct=False,separate=False,context=None,feedback=None):
     TYPES = ['Byte', 'Int16', 'UInt16', 'UInt32', 'Int32', 'Float32', 'Float64', 'CInt16', 'CInt32', 'CFloat32', 'CFloat64']
     feedback.setProgressText("Merge raster")
+    in_files = [gdalInputPath(f) for f in files] if isinstance(files,list) else []
+    if (gdal_direct and in_files and all(in_files) and not pct
+            and gdalOutputPathOk(output)):
+        # Same as gdal_merge : pixel size of first file, last file on top
+        gt = qgsUtils.openRaster(in_files[0]).GetGeoTransform()
+        vrt_options = gdal.BuildVRTOptions(separate=separate,
+            srcNodata=nodata_input,VRTNodata=gdalNodata(nodata_val),
+            xRes=gt[1],yRes=abs(gt[5]))
+        with gdalTmpPath(".vrt") as vrt_path:
+            gdalCall(gdal.BuildVRT,vrt_path,in_files,vrt_options)
+            gdal_options = gdal.TranslateOptions(format='GTiff',
+                outputType=gdalType(out_type),noData=gdalNodata(nodata_val),
+                creationOptions=qgsUtils.getGTiffOptions(out_type),
+                callback=gdalProgress(feedback))
+            return gdalCall(gdal.Translate,output,vrt_path,gdal_options)
     parameters = {
             'DATA_TYPE': qgsTypeToInt(out_type,shift=True),
             'EXTRA': '',
             'INPUT': files,
             'NODATA_INPUT': nodata_input,
             'NODATA_OUTPUT': nodata_val,
-            'OPTIONS' : '|'.join(GTIFF_COPT),
+            'OPTIONS' : '|'.join(qgsUtils.getGTiffOptions(out_type)),
             'PCT': pct,
             'SEPARATE': separate,
             'OUTPUT': output
         }
     return applyProcessingAlg("gdal","merge",parameters,context,feedback)
+# Mosaic of 'files' as VRT file 'out_vrt' : no pixel is copied, output can be
+# given as input to other treatments (warp, clip, ...) as any raster.
+# Same stacking as applyMergeRaster (pixel size of first file, last file on top).
+def applyMergeRasterVrt(files,out_vrt,nodata_val=nodata_val,nodata_input=None,
+                        feedback=None):
+    if feedback:
+        feedback.setProgressText("Merge raster (VRT)")
+    in_files = [rasterInputPath(f) for f in files]
+    if not in_files:
+        utils.user_error("No raster to merge")
+    gt = qgsUtils.openRaster(in_files[0]).GetGeoTransform()
+    gdal_options = gdal.BuildVRTOptions(srcNodata=nodata_input,
+        VRTNodata=gdalNodata(nodata_val),xRes=gt[1],yRes=abs(gt[5]))
+    return gdalCall(gdal.BuildVRT,out_vrt,in_files,gdal_options)
+    
 def applyMergeRaster2(files,output,nodata_val=nodata_val,out_type=Qgis.Float32,
                      nodata_input=None,pct=False,separate=False,context=None,feedback=None):
     TYPES = ['Byte', 'Int16', 'UInt16', 'UInt32', 'Int32', 'Float32', 'Float64', 'CInt16', 'CInt32', 'CFloat32', 'CFloat64']
@@ -888,7 +1166,7 @@ def applyMergeRaster2(files,output,nodata_val=nodata_val,out_type=Qgis.Float32,
             'INPUT': files,
             'NODATA_INPUT': nodata_input,
             'NODATA_OUTPUT': nodata_val,
-            'OPTIONS' : '|'.join(GTIFF_COPT),
+            'OPTIONS' : '|'.join(qgsUtils.getGTiffOptions(out_type)),
             'PCT': pct,
             'SEPARATE': separate,
             # 'OUTPUT': 'memory:'
@@ -910,7 +1188,7 @@ def applyRasterCalcProc(input_a,output,expr,
                    'INPUT_A' : input_a,
                    'NO_DATA' : nodata_val,
                    'OUTPUT' : output,
-                   'OPTIONS' : '|'.join(GTIFF_COPT),
+                   'OPTIONS' : '|'.join(qgsUtils.getGTiffOptions(out_type)),
                    'RTYPE' : qgsTypeToInt(out_type,shift=True) }
     return applyProcessingAlg("gdal","rastercalculator",parameters,context,feedback)
     
@@ -928,19 +1206,36 @@ def applyRasterCalc(input_a,output,expr,
         out_type=out_type,context=context,feedback=feedback)
     return output
     
+# Output = A where A < max_val (A <= max_val if 'or_equal'), nodata elsewhere.
+# Processing is used if input or output is not a file (see blockCalcOk).
+def applyRasterCalcLessThan(input,output,max_val,or_equal=False,
+                      nodata_val=nodata_val,out_type=Qgis.Float32,
+                      context=None,feedback=None):
+    if not blockCalcOk([input],output):
+        lt_func, ge_func = ("less_equal", "less") if or_equal else ("less", "less_equal")
+        expr = lt_func + "(A," + str(max_val) + ")*A+" + ge_func + "(" + str(max_val) + ",A)*" + str(nodata_val)
+        return applyRasterCalc(input,output,expr,nodata_val,out_type,
+                   context=context,feedback=feedback)
+    max_val = float(max_val)
+    nd = float(nodata_val)
+    def calcLT(arrays,masks):
+        a = arrays[0]
+        cond = (a <= max_val) if or_equal else (a < max_val)
+        return np.where(cond,a,nd)
+    return applyBlockCalc([input],output,calcLT,
+        nodata_val=nodata_val,out_type=out_type,feedback=feedback)
+
 def applyRasterCalcLT(input,output,max_val,
                       nodata_val=nodata_val,out_type=Qgis.Float32,
                       context=None,feedback=None):
-    expr = "less(A," + str(max_val) + ")*A+less_equal(" + str(max_val) + ",A)*" + str(nodata_val)
-    return applyRasterCalc(input,output,expr,nodata_val,out_type,
-               context=context,feedback=feedback)
+    return applyRasterCalcLessThan(input,output,max_val,or_equal=False,
+        nodata_val=nodata_val,out_type=out_type,context=context,feedback=feedback)
     
 def applyRasterCalcLE(input,output,max_val,
                       nodata_val=nodata_val,out_type=Qgis.Float32,
                       context=None,feedback=None):
-    expr = "less_equal(A," + str(max_val) + ")*A+less(" + str(max_val) + ",A)*" + str(nodata_val)
-    return applyRasterCalc(input,output,expr,nodata_val,out_type,
-               context=context,feedback=feedback)
+    return applyRasterCalcLessThan(input,output,max_val,or_equal=True,
+        nodata_val=nodata_val,out_type=out_type,context=context,feedback=feedback)
     
 def applyRasterCalcAB(input_a,input_b,output,expr,
                     nodata_val=nodata_val,out_type=Qgis.Float32,
@@ -953,7 +1248,7 @@ def applyRasterCalcAB(input_a,input_b,output,expr,
                    'INPUT_B' : input_b,
                    'NO_DATA' : nodata_val,
                    'OUTPUT' : output,
-                   'OPTIONS' : '|'.join(GTIFF_COPT),
+                   'OPTIONS' : '|'.join(qgsUtils.getGTiffOptions(out_type)),
                    'RTYPE' : qgsTypeToInt(out_type,shift=True) }
     return applyProcessingAlg("gdal","rastercalculator",parameters,
                context=context,feedback=feedback)
@@ -970,27 +1265,51 @@ def applyRasterCalcABC(input_a,input_b,input_c, band_a, band_b, band_c, output,e
                    'INPUT_B' : input_b,
                    'INPUT_C' : input_c,
                    'NO_DATA' : nodata_val,
-                   'OPTIONS' : '|'.join(GTIFF_COPT),
+                   'OPTIONS' : '|'.join(qgsUtils.getGTiffOptions(out_type)),
                    'OUTPUT' : output,
                    'RTYPE' : qgsTypeToInt(out_type,shift=True) }
     return applyProcessingAlg("gdal","rastercalculator",parameters,context,feedback)
     
+# Nodata pixels of one input take the value of the other input,
+# nodata pixels in both inputs are set to nodata in output.
+# 'expr' is a gdal_calc expression, or a function of (A, B) arrays if inputs
+# and output are files (see blockCalcOk).
 def applyRasterCalcAB_ABNull(input_a,input_b,output,expr,
                     nodata_val=nodata_val,out_type=Qgis.Float32,
                     context=None,feedback=None):
-    TYPE = ['Byte', 'Int16', 'UInt16', 'UInt32', 'Int32', 'Float32', 'Float64']
-    if os.path.isfile(output):
+    if not blockCalcOk([input_a,input_b],output):
+        if callable(expr):
+            utils.internal_error("Function expression requires raster files")
+        return applyRasterCalcAB_ABNullProc(input_a,input_b,output,expr,
+            nodata_val=nodata_val,out_type=out_type,context=context,feedback=feedback)
+    calc = mkCalcFunc(expr)
+    nd = float(nodata_val)
+    def calcABNull(arrays,masks):
+        a, b = arrays
+        a_nodata, b_nodata = masks
+        res = calc(A=a,B=b)
+        # Blocks without nodata in both inputs need no replacement
+        if not (a_nodata.any() or b_nodata.any()):
+            return res
+        res = np.where(a_nodata,b,np.where(b_nodata,a,res))
+        return np.where(a_nodata & b_nodata,nd,res)
+    return applyBlockCalc([input_a,input_b],output,calcABNull,
+        nodata_val=nodata_val,out_type=out_type,propagate_nodata=False,
+        feedback=feedback)
+        
+# Processing version of applyRasterCalcAB_ABNull (layers, temporary outputs, ...)
+def applyRasterCalcAB_ABNullProc(input_a,input_b,output,expr,
+                    nodata_val=nodata_val,out_type=Qgis.Float32,
+                    context=None,feedback=None):
+    if isinstance(output,str) and os.path.isfile(output):
         qgsUtils.removeRaster(output)
     tmp_no_data_val = -998
     nd_str = str(tmp_no_data_val)
     nonull_a = QgsProcessingUtils.generateTempFilename("nonull_a.tif")
     nonull_b = QgsProcessingUtils.generateTempFilename("nonull_b.tif")
     nonull_ab = QgsProcessingUtils.generateTempFilename("nonull_ab.tif")
-    nonull_reset = QgsProcessingUtils.generateTempFilename("nonull_reset.tif")
     applyRNull(input_a,tmp_no_data_val,nonull_a,context=context,feedback=feedback)
     applyRNull(input_b,tmp_no_data_val,nonull_b,context=context,feedback=feedback)
-    # a_nodata = str(input_a.dataProvider().sourceNoDataValue(1))
-    # b_nodata = str(input_b.dataProvider().sourceNoDataValue(1))
     expr_wrap = "equal(A," + nd_str + ") * B "
     expr_wrap += " + logical_and(not_equal(A," + nd_str + "),equal(B," + nd_str + ")) * A"
     expr_wrap += " + logical_and(not_equal(A," + nd_str + "),not_equal(B," + nd_str +")) * (" + str(expr) + ")"
@@ -1007,32 +1326,41 @@ def applyRasterCalcAB_ABNull(input_a,input_b,output,expr,
         context=context,feedback=feedback)
     reset_nodata_expr = '(A==' + str(tmp_no_data_val) + ')*' + str(nodata_val)
     reset_nodata_expr += '+(A!=' + str(tmp_no_data_val) + ')*A'
-    applyRasterCalc(nonull_ab,output,reset_nodata_expr,context=context,feedback=feedback)
-    return output
-    # return applyRSetNull(nonull_reset,nodata_val,output)
+    return applyRasterCalc(nonull_ab,output,reset_nodata_expr,context=context,feedback=feedback)
                        
 def applyRasterCalcMult(input_a,input_b,output,
                         nodata_val=nodata_val,out_type=Qgis.Float32,
                         context=None,feedback=None):
-    expr = "A*B"
-    return applyRasterCalcAB(input_a,input_b,output,expr,
-                             nodata_val=nodata_val,out_type=out_type,
-                             context=context,feedback=feedback)
+    if not blockCalcOk([input_a,input_b],output):
+        return applyRasterCalcAB(input_a,input_b,output,"A*B",
+                                 nodata_val=nodata_val,out_type=out_type,
+                                 context=context,feedback=feedback)
+    calc = mkCalcFunc("A*B")
+    def calcMult(arrays,masks):
+        a, b = arrays
+        return calc(A=a,B=b)
+    return applyBlockCalc([input_a,input_b],output,calcMult,
+        nodata_val=nodata_val,out_type=out_type,feedback=feedback)
                    
 def applyRasterCalcMin(input_a,input_b,output,
                        nodata_val=nodata_val,out_type=Qgis.Float32,
                        context=None,feedback=None):
-    min = qgsUtils.getRastersMinMax([input_a,input_b])
-    expr = 'A*less_equal(A,B) + B*less(B,A)'
-    return applyRasterCalcAB_ABNull(input_a,input_b,output,expr,nodata_val=nodata_val,
-                out_type=out_type,context=context,feedback=feedback)
+    if blockCalcOk([input_a,input_b],output):
+        expr = getMinMaxKernel(True)
+    else:
+        expr = 'A*less_equal(A,B) + B*less(B,A)'
+    return applyRasterCalcAB_ABNull(input_a,input_b,output,expr,
+                nodata_val=nodata_val,out_type=out_type,context=context,feedback=feedback)
                    
 def applyRasterCalcMax(input_a,input_b,output,
                        nodata_val=nodata_val,out_type=Qgis.Float32,
                        context=None,feedback=None):
-    expr = 'B*less_equal(A,B) + A*less(B,A) '
-    return applyRasterCalcAB_ABNull(input_a,input_b,output,expr,nodata_val=nodata_val,
-                out_type=out_type,context=context,feedback=feedback)
+    if blockCalcOk([input_a,input_b],output):
+        expr = getMinMaxKernel(False)
+    else:
+        expr = 'B*less_equal(A,B) + A*less(B,A)'
+    return applyRasterCalcAB_ABNull(input_a,input_b,output,expr,
+                nodata_val=nodata_val,out_type=out_type,context=context,feedback=feedback)
   
 def applyProximity(input,output,classes='',band=1,units=0,context=None,feedback=None):
     # { 'BAND' : 1, 'DATA_TYPE' : 5, 'EXTRA' : '', 'INPUT' : 'E:/IRSTEA/IMBE_Verdon/data/clc_lines_raster.tif', 'MAX_DISTANCE' : 0, 'NODATA' : 0, 'OPTIONS' : '', 'OUTPUT' : 'TEMPORARY_OUTPUT', 'REPLACE' : 0, 'UNITS' : 0, 'VALUES' : '1,2,3,4,5' }
@@ -1046,6 +1374,11 @@ def applyProximity(input,output,classes='',band=1,units=0,context=None,feedback=
     return applyProcessingAlg("gdal","proximity",parameters,context,feedback)
   
 def applyBuildVirtualRaster(list_raster, output, crs=None, context=None,feedback=None):
+    in_files = [gdalInputPath(f) for f in list_raster] if isinstance(list_raster,list) else []
+    if (gdal_direct and crs is None and in_files and all(in_files)
+            and gdalOutputPathOk(output,vrt=True)):
+        gdal_options = gdal.BuildVRTOptions(resolution='average')
+        return gdalCall(gdal.BuildVRT,output,in_files,gdal_options)
     parameters = {
         'INPUT': list_raster,
         'RESOLUTION':0,
@@ -1060,6 +1393,339 @@ def applyBuildVirtualRaster(list_raster, output, crs=None, context=None,feedback
     }
     return applyProcessingAlg("gdal","buildvirtualraster",parameters,context,feedback)
     
+"""
+    GDAL PYTHON API
+"""
+
+# If True, GDAL treatments on files (no layer objects, temporary or memory
+# outputs) call GDAL Python bindings directly instead of running processing
+# gdal algorithms (no parameters checking, provider dispatch or subprocess).
+gdal_direct = True
+
+# Returns path of raster/vector file 'input' if it can be opened directly
+# with GDAL, None otherwise
+def gdalInputPath(input):
+    if isinstance(input,QgsRasterLayer):
+        input = qgsUtils.pathOfLayer(input)
+    if isinstance(input,str) and os.path.isfile(input):
+        return input
+    return None
+    
+# Returns True if 'output' is a GeoTIFF (or VRT if 'vrt') file path GDAL can write
+def gdalOutputPathOk(output,vrt=False):
+    if not isinstance(output,str):
+        return False
+    exts = [".vrt"] if vrt else [".tif", ".tiff"]
+    if os.path.splitext(output)[1].lower() not in exts:
+        return False
+    return os.path.isdir(os.path.dirname(os.path.abspath(output)))
+    
+# Returns True if rasters 'inputs' and 'output' are files that applyBlockCalc
+# can process directly (GeoTIFF output), processing is used otherwise
+def blockCalcOk(inputs,output):
+    return (gdal_direct and all(gdalInputPath(i) for i in inputs)
+        and gdalOutputPathOk(output))
+    
+# Returns CRS 'crs' (QgsCoordinateReferenceSystem, layer or string) as GDAL string
+def gdalCrs(crs):
+    if crs is None or crs == '':
+        return None
+    if isinstance(crs,QgsMapLayer):
+        crs = crs.crs()
+    if isinstance(crs,QgsCoordinateReferenceSystem):
+        if not crs.isValid():
+            return None
+        return crs.authid() if crs.authid() else crs.toWkt()
+    return str(crs)
+    
+# Returns bounds (xmin,ymin,xmax,ymax) of QgsRectangle 'rect'
+def rectBounds(rect):
+    return (rect.xMinimum(),rect.yMinimum(),rect.xMaximum(),rect.yMaximum())
+    
+# Returns GDAL command line target extent option of QgsRectangle 'rect'
+def teArgs(rect):
+    return ['-te'] + [str(v) for v in rectBounds(rect)]
+    
+# Returns (bounds, bounds_crs) of 'extent' as expected by GDAL, bounds being
+# (xmin,ymin,xmax,ymax). Extent may be None, a QgsRectangle or a processing
+# extent string 'xmin,xmax,ymin,ymax [crs]'. Returns None if not supported.
+def gdalExtent(extent,extent_crs=None):
+    if extent is None or extent == '':
+        return None, None
+    if isinstance(extent,QgsRectangle):
+        bounds = rectBounds(extent)
+    elif isinstance(extent,str):
+        m = re.match(r'^\s*([^,\[]+),([^,\[]+),([^,\[]+),([^,\[]+?)\s*(\[(.*)\])?\s*$',extent)
+        if not m:
+            return None
+        try:
+            xmin, xmax, ymin, ymax = [float(m.group(i)) for i in range(1,5)]
+        except ValueError:
+            return None
+        bounds = (xmin,ymin,xmax,ymax)
+        if extent_crs is None and m.group(6):
+            extent_crs = m.group(6)
+    else:
+        return None
+    return bounds, gdalCrs(extent_crs)
+    
+# Returns nodata value 'nodata_val' as float for GDAL, None if unset
+def gdalNodata(nodata_val):
+    if nodata_val is None or nodata_val == '':
+        return None
+    return float(nodata_val)
+    
+# Returns GDAL type of 'out_type' (GDT_Unknown to keep input type)
+def gdalType(out_type):
+    if out_type == USE_INPUT_TYPE or out_type is None:
+        return gdal.GDT_Unknown
+    # Qgis.DataType values match GDAL data types
+    return int(out_type)
+    
+# Calls GDAL function 'func' (gdal.Warp, gdal.Translate, ...) creating file
+# 'output' from 'src' with 'options'. Existing output is removed first.
+def gdalCall(func,output,src,options):
+    qgsUtils.clearRasterCache()
+    if os.path.isfile(output):
+        qgsUtils.removeRaster(output)
+    gdal.ErrorReset()
+    with qgsUtils.gdalConfig():
+        ds = func(output,src,options=options)
+    if ds is None:
+        utils.user_error("GDAL " + func.__name__ + " failed for '" + str(output)
+            + "' : " + str(gdal.GetLastErrorMsg()))
+    ds.FlushCache()
+    ds = None
+    return output
+    
+# Returns GDAL progress callback reporting to processing 'feedback'
+def gdalProgress(feedback):
+    if feedback is None:
+        return None
+    def callback(complete,message,data):
+        feedback.setProgress(100 * complete)
+        return 0 if feedback.isCanceled() else 1
+    return callback
+    
+# Yields path of temporary file in GDAL in-memory filesystem (/vsimem/),
+# for intermediate rasters read by GDAL only (not by GRASS or processing).
+# File is removed on exit.
+@contextlib.contextmanager
+def gdalTmpPath(extension=".tif"):
+    path = "/vsimem/" + str(uuid.uuid4()) + extension
+    try:
+        yield path
+    finally:
+        gdal.Unlink(path)
+    
+"""
+    NUMPY RASTER ALGORITHMS
+"""
+
+# Returns path of raster input (path or QgsRasterLayer)
+def rasterInputPath(input):
+    if isinstance(input,QgsRasterLayer):
+        return qgsUtils.pathOfLayer(input)
+    return str(input)
+    
+# Returns function evaluating gdal_calc-like expression 'expr' (numpy syntax)
+# on arrays given as keyword arguments (A=..., B=...).
+# Expression is compiled once. If 'expr' is already a function, it is returned.
+def mkCalcFunc(expr):
+    if callable(expr):
+        return lambda **arrays : expr(*arrays.values())
+    code = compile(str(expr),'<calc>','eval')
+    namespace = dict(vars(np))
+    return lambda **arrays : eval(code,namespace,arrays)
+    
+# Element-wise minimum (is_min) or maximum kernels of two arrays.
+# Kernels are compiled with Numba if installed, numpy ufuncs are used otherwise.
+# Kernels release the GIL, parallelism comes from applyBlockCalc threads
+# (Numba parallel loops must not be launched concurrently from several threads).
+minmax_kernels = {}
+
+def getMinMaxKernel(is_min):
+    if is_min in minmax_kernels:
+        return minmax_kernels[is_min]
+    if utils.numbaIsInstalled():
+        import numba
+        @numba.njit(nogil=True)
+        def minKernel(a,b):
+            out = np.empty(a.shape,a.dtype)
+            for i in range(a.shape[0]):
+                for j in range(a.shape[1]):
+                    out[i,j] = a[i,j] if a[i,j] <= b[i,j] else b[i,j]
+            return out
+        @numba.njit(nogil=True)
+        def maxKernel(a,b):
+            out = np.empty(a.shape,a.dtype)
+            for i in range(a.shape[0]):
+                for j in range(a.shape[1]):
+                    out[i,j] = a[i,j] if a[i,j] >= b[i,j] else b[i,j]
+            return out
+        jit_kernel = minKernel if is_min else maxKernel
+        def kernel(a,b):
+            dtype = np.promote_types(a.dtype,b.dtype)
+            return jit_kernel(a.astype(dtype,copy=False),b.astype(dtype,copy=False))
+    else:
+        kernel = np.minimum if is_min else np.maximum
+    minmax_kernels[is_min] = kernel
+    return kernel
+    
+# Returns boolean mask of pixels of 'arr' equal to 'nodata'
+def nodataMask(arr,nodata):
+    if nodata is None:
+        return np.zeros(arr.shape,dtype=bool)
+    elif np.isnan(nodata):
+        return np.isnan(arr)
+    else:
+        return (arr == nodata)
+        
+# Returns True if 'nodata' may be a value of numpy type 'dtype'
+def nodataInRange(nodata,dtype):
+    if nodata is None:
+        return False
+    if np.issubdtype(dtype,np.integer):
+        info = np.iinfo(dtype)
+        return float(nodata).is_integer() and info.min <= nodata <= info.max
+    return True
+
+# Returns GDAL type of output computed from 'bands' : type of first band
+# (USE_INPUT_TYPE) or largest type of bands (USE_LARGEST_TYPE, as gdal_calc).
+# Type is promoted if 'nodata' is out of its range (e.g. -9999 for Byte).
+def inputsGdalType(bands,out_type,nodata):
+    if out_type == USE_INPUT_TYPE:
+        gdal_type = bands[0].DataType
+    else:
+        gdal_type = max(b.DataType for b in bands)
+    np_type = gdal_array.GDALTypeCodeToNumericTypeCode(gdal_type)
+    if nodata is None or nodataInRange(nodata,np_type):
+        return gdal_type
+    if float(nodata).is_integer():
+        np_type = np.promote_types(np_type,np.min_scalar_type(int(nodata)))
+    else:
+        np_type = np.promote_types(np_type,np.float32)
+    promoted = gdal_array.NumericTypeCodeToGDALTypeCode(np_type)
+    return promoted if promoted else gdal.GDT_Float64
+    
+# Number of threads computing blocks in applyBlockCalc
+block_calc_workers = os.cpu_count() or 1
+
+# Applies 'func' block by block on first band of rasters 'inputs' (same grid).
+# 'func' is called with the list of input arrays and the list of their nodata
+# masks, and returns output array.
+# If 'propagate_nodata' is True, output pixels are set to 'nodata_val' where
+# any input is nodata (as gdal_calc does).
+# Input rasters are read once and output is written once, without
+# intermediate files.
+# Blocks are read and computed by a pool of threads (GDAL I/O and numpy
+# release the GIL), each thread opening its own input datasets since GDAL
+# handles cannot be shared. Output is written by calling thread only.
+def applyBlockCalc(inputs,output,func,nodata_val=nodata_val,out_type=Qgis.Float32,
+        propagate_nodata=True,feedback=None):
+    if feedback:
+        feedback.setProgressText("Raster Calc")
+    paths = [rasterInputPath(i) for i in inputs]
+    in_dss = [qgsUtils.openRaster(p) for p in paths]
+    ref_ds = in_dss[0]
+    for p, ds in zip(paths,in_dss):
+        if (ds.RasterXSize != ref_ds.RasterXSize
+                or ds.RasterYSize != ref_ds.RasterYSize):
+            utils.user_error("Raster " + p + " size does not match raster " + paths[0])
+    bands = [ds.GetRasterBand(1) for ds in in_dss]
+    nodatas = [b.GetNoDataValue() for b in bands]
+    # Nodata out of input type range (e.g. -9999 for Byte) never matches,
+    # such inputs are handled as inputs without nodata
+    np_types = [gdal_array.GDALTypeCodeToNumericTypeCode(b.DataType) for b in bands]
+    nodatas = [n if nodataInRange(n,t) else None for n, t in zip(nodatas,np_types)]
+    nd = None if nodata_val is None else float(nodata_val)
+    if out_type in [USE_INPUT_TYPE, USE_LARGEST_TYPE]:
+        gdal_type = inputsGdalType(bands,out_type,nd)
+    else:
+        # Qgis.DataType values match GDAL data types
+        gdal_type = int(out_type)
+    if os.path.isfile(output):
+        qgsUtils.removeRaster(output)
+    out_ds = qgsUtils.createRasterLike(ref_ds,output,gdal_type,nodata=nd,
+        copt=qgsUtils.getGTiffOptions(Qgis.DataType(gdal_type)))
+    out_band = out_ds.GetRasterBand(1)
+    windows = list(qgsUtils.iterRasterBlocks(bands[0]))
+    thread_data = threading.local()
+    thread_dss = []
+    def calcBlock(window):
+        if not hasattr(thread_data,"bands"):
+            dss = [qgsUtils.openRaster(p,cache=False) for p in paths]
+            thread_dss.extend(dss)
+            thread_data.bands = [ds.GetRasterBand(1) for ds in dss]
+        x, y, w, h = window
+        arrays = [b.ReadAsArray(x,y,w,h) for b in thread_data.bands]
+        masks = [nodataMask(a,n) for a, n in zip(arrays,nodatas)]
+        out = func(arrays,masks)
+        if propagate_nodata and nd is not None:
+            # Only inputs with nodata may set output to nodata
+            nd_masks = [m for m, n in zip(masks,nodatas) if n is not None]
+            if nd_masks:
+                out = np.where(np.logical_or.reduce(nd_masks),nd,out)
+        return out
+    nb_workers = max(1,min(block_calc_workers,len(windows)))
+    # Number of blocks computed ahead of writing is bounded to limit memory
+    max_pending = 2 * nb_workers
+    pending = collections.deque()
+    nb_done = 0
+    def writeNext():
+        (x, y, w, h), future = pending.popleft()
+        out_band.WriteArray(future.result(),x,y)
+        if feedback:
+            feedback.setProgress(100 * (nb_done + 1) / len(windows))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=nb_workers) as executor:
+        try:
+            for window in windows:
+                pending.append((window,executor.submit(calcBlock,window)))
+                if len(pending) >= max_pending:
+                    writeNext()
+                    nb_done += 1
+            while pending:
+                writeNext()
+                nb_done += 1
+        finally:
+            for _, future in pending:
+                future.cancel()
+    thread_dss.clear()
+    out_band.FlushCache()
+    out_band = out_ds = None
+    return output
+    
+# Maximal size of lookup table built by applyReclassLUT
+RECLASS_LUT_MAX_SIZE = 1 << 24
+
+# Reclassifies raster 'in_path' to 'out_path' according to 'reclass_dict'
+# ({old_val -> new_val}), values not in dictionary are set to 'default'.
+# Integer values are reclassified through a lookup table (single gather),
+# other values (float keys or too wide range) through a sorted keys search.
+def applyReclassLUT(in_path,out_path,reclass_dict,default=0,
+        out_type=Qgis.Int32,nodata_val=nodata_val,feedback=None):
+    if not reclass_dict:
+        utils.user_error("Empty reclassification")
+    keys = np.array(sorted(reclass_dict.keys()))
+    vals = np.array([reclass_dict[k] for k in keys.tolist()])
+    lut = None
+    if np.issubdtype(keys.dtype,np.integer):
+        lo, hi = int(keys[0]), int(keys[-1])
+        if hi - lo < RECLASS_LUT_MAX_SIZE:
+            lut = np.full(hi - lo + 1,default,dtype=vals.dtype)
+            lut[keys - lo] = vals
+    def reclass(arrays,masks):
+        a = arrays[0]
+        if lut is not None and np.issubdtype(a.dtype,np.integer):
+            a = a.astype(np.int64,copy=False)
+            inside = (a >= lo) & (a <= hi)
+            res = lut[np.clip(a,lo,hi) - lo]
+            return np.where(inside,res,default)
+        pos = np.clip(np.searchsorted(keys,a),0,len(keys) - 1)
+        return np.where(keys[pos] == a,vals[pos],default)
+    return applyBlockCalc([in_path],out_path,reclass,nodata_val=nodata_val,
+        out_type=out_type,feedback=feedback)
+    
 """
     GRASS ALGORITHMS
 """
@@ -1072,25 +1738,91 @@ def applyVRandom(vector_layer,nb_points,output,context=None,feedback=None):
 
 # { '-a' : False, '-z' : False, 'GRASS_MIN_AREA_PARAMETER' : 0.0001, 'GRASS_OUTPUT_TYPE_PARAMETER' : 0, 'GRASS_REGION_PARAMETER' : None, 'GRASS_SNAP_TOLERANCE_PARAMETER' : -1, 'GRASS_VECTOR_DSCO' : '', 'GRASS_VECTOR_EXPORT_NOCAT' : False, 'GRASS_VECTOR_LCO' : '', 'column' : '', 'column_type' : None, 'npoints' : 100, 'output' : 'TEMPORARY_OUTPUT', 'restrict' : 'E:/IRSTEA/BioDispersal/Tests/BousquetOrbExtended/Source/Reservoirs/RBP_PRAIRIE.shp', 'seed' : None, 'where' : '', 'zmax' : None, 'zmin' : None }
 
-# Apply raster calculator from expression 'expr'.
-# Calculation is made on a single file and a signled band renamed 'A'.
-# Output format is Integer32.
-def applyResample(in_path,out_path,context=None,feedback=None):
+# Resamples 'in_path' to 'resolution' (nearest neighbour) in 'out_path'.
+# With 'backend' 'gdal', resampling is a multithreaded gdal.Warp, otherwise
+# (or if input or output is not a file GDAL can handle) GRASS r.resample is called.
+def applyResample(in_path,out_path,resolution=50,backend='gdal',
+                  context=None,feedback=None):
+    in_file = gdalInputPath(in_path)
+    if backend == 'gdal' and in_file and gdalOutputPathOk(out_path):
+        in_type = qgsUtils.openRaster(in_file).GetRasterBand(1).DataType
+        gdal_options = gdal.WarpOptions(format='GTiff',
+            xRes=resolution,yRes=resolution,resampleAlg='near',
+            multithread=True,warpOptions=['NUM_THREADS=ALL_CPUS'],
+            creationOptions=qgsUtils.getGTiffOptions(in_type),
+            callback=gdalProgress(feedback))
+        return gdalCall(gdal.Warp,out_path,in_file,gdal_options)
     parameters = {'input' : in_path,
                   'output' : out_path,
                   '--overwrite' : True,
-                  'GRASS_REGION_CELLSIZE_PARAMETER' : 50,
+                  'GRASS_REGION_CELLSIZE_PARAMETER' : resolution,
                   'GRASS_SNAP_TOLERANCE_PARAMETER' : -1,
                   'GRASS_RASTER_FORMAT_OPT': ','.join(GTIFF_COPT),
                   'GRASS_MIN_AREA_PARAMETER' : 0}
     return applyGrassAlg("r.resample",parameters,context,feedback)
     
+# Parses r.reclass rules file 'rules_file' ('1 2 = 10 label' lines) and
+# returns dictionary {old_val -> new_val} (NULL as nodata_val).
+# Returns None if rules are not integer categories (ranges, wildcards, ...).
+def parseReclassRules(rules_file):
+    res = {}
+    with open(rules_file,encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line == 'end':
+                break
+            if line.count('=') != 1:
+                return None
+            lhs, rhs = line.split('=')
+            rhs = rhs.split()
+            old_vals = lhs.split()
+            if not rhs or not old_vals:
+                return None
+            if rhs[0].upper() == 'NULL':
+                new_val = int(nodata_val)
+            elif utils.is_integer(rhs[0]):
+                new_val = int(rhs[0])
+            else:
+                return None
+            for v in old_vals:
+                if not utils.is_integer(v):
+                    return None
+                res[int(v)] = new_val
+    return res
+    
+@utils.memoizeFile(("in_path","rules_file"),"out_path",settings=memoSettings)
 def applyReclassGdal(in_path,out_path,rules_file,title,context=None,feedback=None):
+    # GRASS region cell size (output resolution)
+    cellsize = 50
+    reclass_dict = parseReclassRules(rules_file)
+    in_file = gdalInputPath(in_path)
+    if reclass_dict and in_file and gdalOutputPathOk(out_path):
+        in_ds = qgsUtils.openRaster(in_file)
+        in_type = in_ds.GetRasterBand(1).DataType
+        in_dtype = gdal_array.GDALTypeCodeToNumericTypeCode(in_type)
+        if in_dtype is not None and np.issubdtype(in_dtype,np.integer):
+            # Categories not in rules are NULL, as with r.reclass. Nearest
+            # resampling to region cell size commutes with reclassification.
+            gt = in_ds.GetGeoTransform()
+            if all(math.isclose(res,cellsize,rel_tol=1e-6)
+                    for res in [gt[1], abs(gt[5])]):
+                return applyReclassLUT(in_file,out_path,reclass_dict,
+                    default=int(nodata_val),feedback=feedback)
+            tmp_path = utils.mkTmpPath(out_path)
+            try:
+                applyReclassLUT(in_file,tmp_path,reclass_dict,
+                    default=int(nodata_val),feedback=feedback)
+                return applyResample(tmp_path,out_path,resolution=cellsize,
+                    context=context,feedback=feedback)
+            finally:
+                qgsUtils.removeRaster(tmp_path)
     parameters = {'input' : in_path,
                   'output' : out_path,
                   'rules' : rules_file,
                   'title' : title,
-                  'GRASS_REGION_CELLSIZE_PARAMETER' : 50,
+                  'GRASS_REGION_CELLSIZE_PARAMETER' : cellsize,
                   'GRASS_SNAP_TOLERANCE_PARAMETER' : -1,
                   'GRASS_RASTER_FORMAT_OPT': ','.join(GTIFF_COPT),
                   'GRASS_MIN_AREA_PARAMETER' : 0}
@@ -1109,12 +1841,18 @@ def applyRSetNull(in_path,new_val,out_path,context=None,feedback=None):
     return applyGrassAlg("r.null",parameters,context,feedback)
     
 def applyRBuffer(in_path,buffer_vals,out_path,context=None,feedback=None):
+    parameters = rBufferParams(in_path,buffer_vals,out_path)
+    return applyGrassAlg("r.buffer.lowmem",parameters,context,feedback)
+    
+# Applies r.buffer for each (in_path,buffer_vals,out_path) of 'calls'
+def applyRBufferBatch(calls,context=None,feedback=None):
+    specs = [("r.buffer.lowmem",rBufferParams(*c)) for c in calls]
+    return applyGrassAlgBatch(specs,context,feedback)
+    
+# Parameters of r.buffer.lowmem call
+def rBufferParams(in_path,buffer_vals,out_path):
     utils.checkFileExists(in_path,"Buffer input layer ")
-    distances_str = ""
-    for v in buffer_vals:
-        if distances_str != "":
-            distances_str += ","
-        distances_str += str(v)
+    distances_str = ",".join(str(v) for v in buffer_vals)
     parameters = { 'input' : in_path,
                     'output' : out_path,
                     'distances' : distances_str, #"0,100,200",
@@ -1127,9 +1865,19 @@ def applyRBuffer(in_path,buffer_vals,out_path,context=None,feedback=None):
                     '-z' : False,
                     '--type' : 'Int32',
                     '--overwrite' : False}
-    return applyGrassAlg("r.buffer.lowmem",parameters,context,feedback)
+    return parameters
     
 def applyRCost(start_path,cost_path,cost,out_path,context=None,feedback=None):
+    parameters = rCostParams(start_path,cost_path,cost,out_path)
+    return applyGrassAlg("r.cost",parameters,context,feedback)
+    
+# Applies r.cost for each (start_path,cost_path,cost,out_path) of 'calls'
+def applyRCostBatch(calls,context=None,feedback=None):
+    specs = [("r.cost",rCostParams(*c)) for c in calls]
+    return applyGrassAlgBatch(specs,context,feedback)
+    
+# Parameters of r.cost call
+def rCostParams(start_path,cost_path,cost,out_path):
     utils.checkFileExists(start_path,"Dispersion Start Layer ")
     utils.checkFileExists(cost_path,"Dispersion Permeability Raster ")
     parameters = { 'input' : cost_path,
@@ -1155,7 +1903,83 @@ def applyRCost(start_path,cost_path,cost,out_path,context=None,feedback=None):
                     '-i' : False,
                     '-b' : False,
                     '--overwrite' : True}
-    return applyGrassAlg("r.cost",parameters,context,feedback)
+    return parameters
+    
+# Number of pixels per side of tiles computed by applyRCostTiled
+RCOST_TILE_SIZE = 4096
+
+# Same as applyRCost, computed tile by tile for large rasters ('start_path'
+# and 'cost_path' on same grid). Each tile is extended by an overlap of
+# 'cost' / (minimal cell cost) pixels : a cost path below 'cost' cannot be
+# longer, so tile core values are exact. Tiles with no start cell in their
+# extended window are not computed (nodata in output).
+# r.cost calls are sequential (GRASS session is shared, see applyGrassAlgBatch).
+# Falls back to a single r.cost call if tiling is not possible or useless.
+def applyRCostTiled(start_path,cost_path,cost,out_path,tile_size=RCOST_TILE_SIZE,
+                    context=None,feedback=None):
+    start_ds = qgsUtils.openRaster(start_path)
+    cost_ds = qgsUtils.openRaster(cost_path)
+    xsize, ysize = cost_ds.RasterXSize, cost_ds.RasterYSize
+    same_grid = ((start_ds.RasterXSize, start_ds.RasterYSize) == (xsize, ysize)
+        and start_ds.GetGeoTransform() == cost_ds.GetGeoTransform())
+    min_cost = cost_ds.GetRasterBand(1).ComputeRasterMinMax(False)[0]
+    if not same_grid or min_cost is None or min_cost <= 0:
+        return applyRCost(start_path,cost_path,cost,out_path,context,feedback)
+    overlap = int(math.ceil(float(cost) / min_cost)) + 1
+    if overlap >= tile_size or (xsize <= tile_size and ysize <= tile_size):
+        return applyRCost(start_path,cost_path,cost,out_path,context,feedback)
+    start_band = start_ds.GetRasterBand(1)
+    start_nodata = start_band.GetNoDataValue()
+    # (core window, extended window) of tiles containing start cells
+    tiles = []
+    for y in range(0,ysize,tile_size):
+        for x in range(0,xsize,tile_size):
+            core = (x, y, min(tile_size,xsize - x), min(tile_size,ysize - y))
+            x0, y0 = max(0,x - overlap), max(0,y - overlap)
+            x1 = min(xsize,x + core[2] + overlap)
+            y1 = min(ysize,y + core[3] + overlap)
+            win = (x0, y0, x1 - x0, y1 - y0)
+            start_arr = start_band.ReadAsArray(*win)
+            if not nodataMask(start_arr,start_nodata).all():
+                tiles.append((core,win))
+    utils.debug("r.cost on " + str(len(tiles)) + " tiles, overlap = " + str(overlap))
+    if not tiles:
+        return applyRCost(start_path,cost_path,cost,out_path,context,feedback)
+    tmp_files, specs, tile_outs = [], [], []
+    try:
+        for i, (core, win) in enumerate(tiles):
+            tile_paths = [utils.mkTmpPath(out_path,suffix="_tile" + str(i) + s)
+                for s in ["_start","_cost",""]]
+            tmp_files.extend(tile_paths)
+            for in_path, tile_path in zip([start_path,cost_path],tile_paths):
+                gdal_options = gdal.TranslateOptions(format='GTiff',
+                    srcWin=list(win),creationOptions=GTIFF_COPT)
+                gdalCall(gdal.Translate,tile_path,in_path,gdal_options)
+            specs.append(("r.cost",rCostParams(tile_paths[0],tile_paths[1],
+                cost,tile_paths[2])))
+            tile_outs.append(tile_paths[2])
+        applyGrassAlgBatch(specs,context,feedback)
+        ref_band = qgsUtils.openRaster(tile_outs[0],cache=False).GetRasterBand(1)
+        out_type, out_nodata = ref_band.DataType, ref_band.GetNoDataValue()
+        ref_band = None
+        if os.path.isfile(out_path):
+            qgsUtils.removeRaster(out_path)
+        out_ds = qgsUtils.createRasterLike(cost_ds,out_path,out_type,
+            nodata=out_nodata,copt=qgsUtils.getGTiffOptions(out_type))
+        out_band = out_ds.GetRasterBand(1)
+        if out_nodata is not None:
+            out_band.Fill(out_nodata)
+        for (core, win), tile_out in zip(tiles,tile_outs):
+            tile_ds = qgsUtils.openRaster(tile_out,cache=False)
+            arr = tile_ds.GetRasterBand(1).ReadAsArray(core[0] - win[0],
+                core[1] - win[1],core[2],core[3])
+            out_band.WriteArray(arr,core[0],core[1])
+            tile_ds = None
+        out_band = out_ds = None
+    finally:
+        for f in tmp_files:
+            qgsUtils.removeRaster(f)
+    return out_path
     
 def applyRCostFilterMaxCost(start_path,cost_path,cost,out_path,context=None,feedback=None):
     tmp_path = utils.mkTmpPath(out_path,suffix="_disp_tmp")
@@ -1193,97 +2017,90 @@ def applyRSeries(layers,aggr_func,output,range=None,context=None,feedback=None):
 # Resolution set to 25 if not given.
 # Extent can be given through 'extent_path'. If not, it is extracted from input layer.
 # Output raster layer is loaded in QGIS if 'load_flag' is True.
+@utils.memoizeFile(("in_path","extent_path"),"out_path",settings=memoSettings)
 def applyRasterizationCmd(in_path,field,out_path,extent_path,
                        resolution=None,load_flag=False,to_byte=False,
-                       more_args=[]):
+                       more_args=[],overviews=True):
     utils.debug("applyRasterizationCmd")
-    in_layer = qgsUtils.loadVectorLayer(in_path)
-    if extent_path:
-        extent_layer = qgsUtils.loadLayer(extent_path)
-    else:
-        extent_layer = qgsUtils.loadVectorLayer(in_path)
-    extent = extent_layer.extent()
-    #extent_crs = qgsUtils.getLayerCrsStr(extent_layer)
-    extent_crs = extent_layer.crs()
-    #utils.internal_error("TODO : params refactoring needed")
-    #transformed_extent = params.params.getBoundingBox(extent,extent_crs)
-    transformed_extent = extent
-    x_min = transformed_extent.xMinimum()
-    x_max = transformed_extent.xMaximum()
-    y_min = transformed_extent.yMinimum()
-    y_max = transformed_extent.yMaximum()
+    utils.checkFileExists(in_path)
+    extent, extent_crs = qgsUtils.getExtentOfPath(extent_path or in_path)
+    # Output is in input layer CRS (read from datasource, input layer is
+    # not loaded when extent comes from another file)
+    if extent_path and extent_crs.isValid():
+        in_crs = qgsUtils.getVectorCrsOfPath(in_path)
+        if in_crs.isValid() and extent_crs != in_crs:
+            extent = qgsUtils.transformBoundingBox(extent,extent_crs,in_crs)
     utils.debug("resolution  = " + str(resolution))
     if resolution == 0.0:
         utils.user_error("Empty resolution")
-    parameters = [gdal_rasterize_cmd,
-                  '-at',
-                  '-te',str(x_min),str(y_min),str(x_max),str(y_max),
-                  #'-ts', str(width), str(height),
-                  '-tr', str(resolution), str(resolution),
-                  #'-ot','Int32',
-                  #'-a_srs','epsg:2154',
-                  '-of','GTiff']
-                  #'-a_nodata',nodata_val]
+    # gdal_rasterize default output type is Float64
+    out_type = Qgis.Int16 if to_byte else Qgis.Float64
+    rasterize_args = {}
     if to_byte:
-        parameters.extend(['-ot', 'Int16','-a_nodata',nodata_val])
+        rasterize_args['outputType'] = gdal.GDT_Int16
+        rasterize_args['noData'] = gdalNodata(nodata_val)
     if field == "geom":
-        parameters.extend(['-burn', '1'])
+        rasterize_args['burnValues'] = [1]
     else:
-        parameters.extend(['-a',field])
-    for opt in GTIFF_COPT:
-        parameters.extend(['-co', opt])
-    parameters.extend(more_args)
-    parameters.extend([in_path,out_path])
-    utils.debug("rasterization cmd = " + str(parameters))
-    p = subprocess.Popen(parameters,stderr=subprocess.PIPE)
-    out,err = p.communicate()
-    utils.debug(str(p.args))
-    if out:
-        utils.info(str(out))
-    if err:
-        utils.user_error(str(err))
-    elif load_flag:
+        rasterize_args['attribute'] = field
+    # Rasterized in process : features are read and burnt by GDAL bindings,
+    # no gdal_rasterize process is spawned. 'more_args' are gdal_rasterize
+    # command-line options, parsed by GDAL as well.
+    # GDAL settings (GDAL_NUM_THREADS, ...) are set for this call only by
+    # gdalCall (qgsUtils.gdalConfig). Block cache size is GDAL default unless
+    # qgsUtils.setGdalConfig has been called (opt-in, process wide).
+    gdal_options = gdal.RasterizeOptions(options=list(more_args),
+        format='GTiff',allTouched=True,
+        outputBounds=list(rectBounds(extent)),
+        xRes=float(resolution),yRes=float(resolution),
+        creationOptions=qgsUtils.getGTiffOptions(out_type),
+        **rasterize_args)
+    utils.debug("rasterization options = " + str(gdal_options))
+    gdalCall(gdal.Rasterize,out_path,in_path,gdal_options)
+    if overviews:
+        qgsUtils.buildOverviews(out_path)
+    if load_flag:
         res_layer = qgsUtils.loadRasterLayer(out_path)
         QgsProject.instance().addMapLayer(res_layer)
         
         
 # TODO
+@utils.memoizeFile(("in_path","extent_path"),"out_path",settings=memoSettings)
 def applyWarpGdal(in_path,out_path,resampling_mode,
                   crs=None,resolution=None,extent_path=None,
-                  load_flag=False,to_byte=False):
+                  load_flag=False,to_byte=False,overviews=True):
     utils.debug("qgsTreatments.applyWarpGdal")
-    in_layer = qgsUtils.loadRasterLayer(in_path)
-    if extent_path:
-        utils.debug("extent_path = " + str(extent_path))
-        extent_layer = qgsUtils.loadLayer(extent_path)
-    else:
-        extent_layer = in_layer
-    extent = extent_layer.extent()
-    extent_crs = extent_layer.crs()
-    utils.internal_error("TODO : params refactoring")
-    transformed_extent = params.paramsModel.getBoundingBox(extent,extent_crs)
-    x_min = transformed_extent.xMinimum()
-    x_max = transformed_extent.xMaximum()
-    y_min = transformed_extent.yMinimum()
-    y_max = transformed_extent.yMaximum()
+    utils.debug("extent_path = " + str(extent_path))
+    extent, extent_crs = qgsUtils.getExtentOfPath(extent_path or in_path)
+    in_crs = qgsUtils.getExtentOfPath(in_path)[1]
+    if crs is None:
+        crs = in_crs
+    # Target extent expressed in output CRS
+    if extent_crs.isValid() and extent_crs != crs:
+        extent = qgsUtils.transformBoundingBox(extent,extent_crs,crs)
+    # Input header read from cached dataset (no layer or provider created)
+    in_ds = qgsUtils.openRaster(in_path)
     if not resolution:
-        resolution = in_layer.rasterUnitsPerPixelX()
+        resolution = in_ds.GetGeoTransform()[1]
         utils.warn("Setting rasterization resolution to " + str(resolution))
     #width = int((x_max - x_min) / float(resolution))
     #height = int((y_max - y_min) / float(resolution))
-    in_crs = qgsUtils.getLayerCrsStr(in_layer)
-    extent_crs = qgsUtils.getLayerCrsStr(extent_layer)
     cmd_args = [gdal_warp_cmd,
-                '-s_srs',in_crs,
+                '-s_srs',in_crs.authid(),
                 '-t_srs',crs.authid(),
-                '-te',str(x_min),str(y_min),str(x_max),str(y_max),
+                *teArgs(extent),
                 #'-te_srs',extent_crs,
                 #'-ts', str(width), str(height),
                 '-tr', str(resolution), str(resolution),
                 #'-dstnodata',nodata_val,
                 #'-ot','Int16',
-                '-overwrite']
-    for opt in GTIFF_COPT:
+                '-overwrite',
+                # Multithreaded warp (I/O and computation overlap, warp on all cores)
+                '-multi', '-wo', 'NUM_THREADS=ALL_CPUS',
+                '--config', 'GDAL_CACHEMAX', '50%']
+    # Qgis.DataType values are GDAL types values
+    out_type = Qgis.Int16 if to_byte else in_ds.GetRasterBand(1).DataType
+    for opt in qgsUtils.getGTiffOptions(out_type):
         cmd_args.extend(['-co', opt])
     if resampling_mode:
         cmd_args.extend(['-r', resampling_mode])
@@ -1292,7 +2109,13 @@ def applyWarpGdal(in_path,out_path,resampling_mode,
         cmd_args.extend(['-ot','Int16'])
     #cmd_args += more_args
     cmd_args += [in_path, out_path]
+    # Cached datasets must not lock output rewritten by gdalwarp
+    in_ds = None
+    qgsUtils.clearRasterCache()
     utils.executeCmd(cmd_args)
+    if overviews:
+        qgsUtils.buildOverviews(out_path,resampling="NEAREST"
+            if resampling_mode in [None,'near'] else "AVERAGE")
     if load_flag:
         res_layer = qgsUtils.loadRasterLayer(out_path)
         QgsProject.instance().addMapLayer(res_layer)
@@ -1317,21 +2140,55 @@ def applyReclassProcessing(in_path,out_path,rules_file,title):
     finally:
         utils.debug("End reclass")
         
+# If True, gdal_calc based functions evaluate expressions in process
+# (block by block with numpy, see applyBlockCalc) instead of running gdal_calc
+gdal_calc_in_process = True
+
+# Evaluates gdal_calc expression 'expr' on rasters 'inputs' ({'A' : path, ...})
+# in process and writes result to 'out_path'. Output type 'type' is a GDAL
+# type name ('Int32', 'Float32', ...), largest input type if None (as gdal_calc).
+# As gdal_calc, input nodata pixels are set to 'nodata' unless 'hide_nodata'.
+def applyGdalCalcInProcess(inputs,out_path,expr,type=None,nodata=nodata_val,
+        hide_nodata=False):
+    names = list(inputs.keys())
+    calc = mkCalcFunc(expr)
+    def calcExpr(arrays,masks):
+        return calc(**dict(zip(names,arrays)))
+    if type:
+        out_type = Qgis.DataType(gdal.GetDataTypeByName(str(type)))
+    else:
+        out_type = USE_LARGEST_TYPE
+    return applyBlockCalc(list(inputs.values()),out_path,calcExpr,
+        nodata_val=nodata,out_type=out_type,propagate_nodata=not hide_nodata)
+
 # Apply raster calculator from expression 'expr'.
 # Calculation is made on a single file and a signled band renamed 'A'.
 # Output format is Integer32.
+# If 'hide_nodata', input nodata pixels are given to expression as any value
+# (to be handled in 'expr') instead of being set to nodata in output.
+@utils.memoizeFile(("in_path",),"out_path",settings=memoSettings)
 def applyGdalCalc(in_path,out_path,expr,type='Int32',nodata=nodata_val,
-        load_flag=False,more_args=[]):
+        load_flag=False,more_args=[],hide_nodata=False):
     # global gdal_calc_cmd
     utils.debug("qgsTreatments.applyGdalCalc(" + str(expr) + ")")
     if os.path.isfile(out_path):
         qgsUtils.removeRaster(out_path)
-    #cmd_args = ['gdal_calc.bat',
-    if utils.platform_sys:
-        cmd_args = ['gdal_calc.bat']
-    else:
-        cmd_args = ['gdal_calc.py']
-    # gdal_calc_cmd = 'gdal_calc.bat' if utils.platform_sys == 'Windows' else 'gdal_calc.py'
+    if '--hideNoData' in more_args:
+        hide_nodata = True
+        more_args = [a for a in more_args if a != '--hideNoData']
+    type_args = [a for a in more_args if a.startswith('--type=')]
+    if (gdal_calc_in_process and len(type_args) == len(more_args)
+            and blockCalcOk([in_path],out_path)):
+        if type_args:
+            type = type_args[-1][len('--type='):]
+        applyGdalCalcInProcess({'A' : in_path},out_path,expr,
+            type=type if isinstance(type,str) else None,nodata=nodata,
+            hide_nodata=hide_nodata)
+        if load_flag:
+            res_layer = qgsUtils.loadRasterLayer(out_path)
+            QgsProject.instance().addMapLayer(res_layer)
+        return
+    cmd_args = getGdalCalcCmd()
     utils.debug("cmd_args commnad = " + str(cmd_args))
     cmd_args.extend([
                 '-A', in_path,
@@ -1339,7 +2196,10 @@ def applyGdalCalc(in_path,out_path,expr,type='Int32',nodata=nodata_val,
                 '--outfile=' + out_path,
                 '--NoDataValue=' + str(nodata),
                 '--overwrite'])
-    cmd_args.extend(['--co', " ".join(GTIFF_COPT)])
+    if hide_nodata:
+        cmd_args.append('--hideNoData')
+    for opt in GTIFF_COPT:
+        cmd_args.extend(['--co', opt])
     cmd_args.extend(more_args)
     expr_opt = '--calc=' + expr
     # expr_opt = '--calc="A*2"'
@@ -1350,31 +2210,47 @@ def applyGdalCalc(in_path,out_path,expr,type='Int32',nodata=nodata_val,
         QgsProject.instance().addMapLayer(res_layer)
         
 # Filters input raster 'in_path' to keep values inferior to 'max_val' 
-# in output raster 'out_path'.
+# in output raster 'out_path' (and non-negative), other pixels set to nodata.
 def applyFilterGdalFromMaxVal(in_path,out_path,max_val,load_flag=False):
     utils.debug("qgsTreatments.applyReclassGdalFromMaxVal(" + str(max_val) + ")")
-    expr = ('(A*less_equal(A,' + str(max_val) + ')*less_equal(0,A))'
-        + '+(' + str(nodata_val) + '*less(' + str(max_val) + ',A))'
-        + '+(' + str(nodata_val) + '*less(A,0))')
-    applyGdalCalc(in_path,out_path,expr,load_flag,more_args=['--type=Float32'])
+    if not (gdal_calc_in_process and blockCalcOk([in_path],out_path)):
+        expr = ('(A*less_equal(A,' + str(max_val) + ')*less_equal(0,A))'
+            + '+(' + str(nodata_val) + '*less(' + str(max_val) + ',A))'
+            + '+(' + str(nodata_val) + '*less(A,0))')
+        applyGdalCalc(in_path,out_path,expr,type='Float32',load_flag=load_flag)
+        return
+    max_val = float(max_val)
+    nd = float(nodata_val)
+    def filterMaxVal(arrays,masks):
+        a = arrays[0]
+        return np.where((a >= 0) & (a <= max_val),a,nd)
+    applyBlockCalc([in_path],out_path,filterMaxVal,out_type=Qgis.Float32)
+    if load_flag:
+        res_layer = qgsUtils.loadRasterLayer(out_path)
+        QgsProject.instance().addMapLayer(res_layer)
     
 # Applies reclassification from 'in_path' to 'out_path' according to 'reclass_dict'.
 # Dictionary contains associations of type {old_val -> new_val}.
 # Pixels of value 'old_val' are set to 'new_val' value.
+# Values not in 'reclass_dict' are set to 0, nodata pixels remain nodata.
 def applyReclassGdalFromDict(in_path,out_path,reclass_dict,load_flag=False):
     utils.debug("qgsTreatments.applyReclassGdalFromDict(" + str(reclass_dict) + ")")
-    expr = ''
-    for old_cls,new_cls in reclass_dict.items():
-        if expr != '':
-            expr += '+'
-        expr += str(new_cls) + '*(A==' + str(old_cls)+ ')'
-    applyGdalCalc(in_path,out_path,expr,load_flag)
+    applyReclassLUT(in_path,out_path,reclass_dict)
+    if load_flag:
+        res_layer = qgsUtils.loadRasterLayer(out_path)
+        QgsProject.instance().addMapLayer(res_layer)
     
 def applyGdalCalcAB_ANull(in_path1,in_path2,out_path,expr,load_flag=False):
     utils.debug("qgsTreatments.applyGdalCalcAB")
     if os.path.isfile(out_path):
         qgsUtils.removeRaster(out_path)
-    cmd_args = [gdal_calc_cmd,
+    if gdal_calc_in_process:
+        applyGdalCalcInProcess({'A' : in_path1, 'B' : in_path2},out_path,expr)
+        if load_flag:
+            res_layer = qgsUtils.loadRasterLayer(out_path)
+            QgsProject.instance().addMapLayer(res_layer)
+        return
+    cmd_args = getGdalCalcCmd() + [
                 '-A', in_path1,
                 '-B', in_path2,
                 #'--type=Int32',
@@ -1382,47 +2258,77 @@ def applyGdalCalcAB_ANull(in_path1,in_path2,out_path,expr,load_flag=False):
                 '--overwrite',
                 '--outfile='+out_path]
     expr_opt = '--calc=' + str(expr)
-    cmd_args.extend(['--co', " ".join(GTIFF_COPT)])
+    for opt in GTIFF_COPT:
+        cmd_args.extend(['--co', opt])
     cmd_args.append(expr_opt)
     utils.executeCmd(cmd_args)
     if load_flag:
         res_layer = qgsUtils.loadRasterLayer(out_path)
         QgsProject.instance().addMapLayer(res_layer)
     
+# Returns gdal_calc expression equal to input 'name' (of raster 'path')
+# where nodata pixels are replaced by 'null_val'
+def gdalCalcNoNull(name,path,null_val):
+    nd = qgsUtils.openRaster(path).GetRasterBand(1).GetNoDataValue()
+    if nd is None:
+        return name
+    if np.isnan(nd):
+        cond = "isnan(" + name + ")"
+    else:
+        cond = name + "==" + repr(nd)
+    return "where(" + cond + "," + str(null_val) + "," + name + ")"
+    
+# Runs gdal_calc on rasters 'in_path1' (A) and 'in_path2' (B) with expression
+# 'expr'. Output pixels are nodata where any input is nodata unless 'hide_nodata'.
+def runGdalCalcAB(in_path1,in_path2,out_path,expr,hide_nodata=False):
+    cmd_args = getGdalCalcCmd() + [
+                '-A', in_path1,
+                '-B', in_path2,
+                '--NoDataValue='+nodata_val,
+                '--overwrite',
+                '--outfile='+out_path]
+    if hide_nodata:
+        cmd_args.append('--hideNoData')
+    for opt in GTIFF_COPT:
+        cmd_args.extend(['--co', opt])
+    cmd_args.append('--calc=' + str(expr))
+    utils.executeCmd(cmd_args)
+
 # Creates raster 'out_path' from 'in_path1', 'in_path2' and 'expr'.
-# def applyGdalCalcAB(in_path1,in_path2,out_path,expr,load_flag=False):
-    # utils.debug("qgsTreatments.applyGdalCalcAB")
-    # if os.path.isfile(out_path):
-        # qgsUtils.removeRaster(out_path)
-    # tmp_no_data_val = -1
-    # nonull_p1 = utils.mkTmpPath(in_path1,suffix="_nonull")
-    # nonull_p2 = utils.mkTmpPath(in_path2,suffix="_nonull")
-    # nonull_out = utils.mkTmpPath(out_path,suffix="_nonull")
-    # nonull_out_tmp = utils.mkTmpPath(nonull_out,suffix="_tmp")
-    # applyRNull(in_path1,tmp_no_data_val,nonull_p1)
-    # applyRNull(in_path2,tmp_no_data_val,nonull_p2)
-    # cmd_args = [gdal_calc_cmd,
-                # '-A', nonull_p1,
-                # '-B', nonull_p2,
-                # '--NoDataValue='+nodata_val,
-                # '--overwrite',
-                # '--outfile='+nonull_out]
-    # expr_opt = '--calc=' + str(expr)
-    # cmd_args.append(expr_opt)
-    # utils.executeCmd(cmd_args)
-    # reset_nodata_expr = '(A==' + str(tmp_no_data_val) + ')*' + str(nodata_val)
-    # reset_nodata_expr += '+(A!=' + str(tmp_no_data_val) + ')*A'
-    # applyGdalCalc(nonull_out,nonull_out_tmp,reset_nodata_expr)
-    # applyRSetNull(nonull_out_tmp,nodata_val,out_path)
-    # remove_tmp_flag = not utils.debug_flag
-    # if remove_tmp_flag:
-        # qgsUtils.removeRaster(nonull_p1)
-        # qgsUtils.removeRaster(nonull_p2)
-        # qgsUtils.removeRaster(nonull_out)
-        # qgsUtils.removeRaster(nonull_out_tmp)
-    # if load_flag:
-        # res_layer = qgsUtils.loadRasterLayer(out_path)
-        # QgsProject.instance().addMapLayer(res_layer)
+# Nodata pixels of inputs are set to 'tmp_no_data_val' before evaluating 'expr'
+# and output pixels equal to 'tmp_no_data_val' are set to nodata (as previous
+# r.null / gdal_calc / r.setnull chain), within a single gdal_calc call.
+# In process, 'expr' is evaluated once per pixel.
+@utils.memoizeFile(("in_path1","in_path2"),"out_path",settings=memoSettings)
+def applyGdalCalcAB(in_path1,in_path2,out_path,expr,load_flag=False,
+        tmp_no_data_val=-1):
+    utils.debug("qgsTreatments.applyGdalCalcAB")
+    if os.path.isfile(out_path):
+        qgsUtils.removeRaster(out_path)
+    if gdal_calc_in_process:
+        calc = mkCalcFunc(expr)
+        nd = float(nodata_val)
+        def calcAB(arrays,masks):
+            a, b = [np.where(m,tmp_no_data_val,arr) if m.any() else arr
+                for arr, m in zip(arrays,masks)]
+            res = calc(A=a,B=b)
+            return np.where(res == tmp_no_data_val,nd,res)
+        applyBlockCalc([in_path1,in_path2],out_path,calcAB,nodata_val=nodata_val,
+            out_type=USE_LARGEST_TYPE,propagate_nodata=False)
+        if load_flag:
+            res_layer = qgsUtils.loadRasterLayer(out_path)
+            QgsProject.instance().addMapLayer(res_layer)
+        return
+    # Input nodata values are handled in expression (--hideNoData)
+    no_null = { 'A' : gdalCalcNoNull('A',in_path1,tmp_no_data_val),
+                'B' : gdalCalcNoNull('B',in_path2,tmp_no_data_val) }
+    fused_expr = re.sub(r'\b(A|B)\b',lambda m : no_null[m.group(1)],str(expr))
+    full_expr = ("where((" + fused_expr + ")==" + str(tmp_no_data_val)
+        + "," + str(nodata_val) + "," + fused_expr + ")")
+    runGdalCalcAB(in_path1,in_path2,out_path,full_expr,hide_nodata=True)
+    if load_flag:
+        res_layer = qgsUtils.loadRasterLayer(out_path)
+        QgsProject.instance().addMapLayer(res_layer)
     
 # Applies ponderation on 'in_path1' according to 'in_path2' values.
 # Result stored in 'out_path'.
@@ -1430,44 +2336,85 @@ def applyPonderationGdal(a_path,b_path,out_path,pos_values=False):
     utils.debug("qgsTreatments.applyPonderationGdal")
     if os.path.isfile(out_path):
         qgsUtils.removeRaster(out_path)
-    cmd_args = [gdal_calc_cmd,
-                '-A', a_path,
-                '-B', b_path,
-                #'--type=Int32',
-                '--NoDataValue='+nodata_val,
-                '--overwrite',
-                '--outfile='+out_path]
     if pos_values:
-        expr_opt = '--calc=A*B*less_equal(0,A)*less_equal(0,B)'
+        expr = 'A*B*less_equal(0,A)*less_equal(0,B)'
     else:
-        expr_opt = '--calc=A*B'
-    cmd_args.extend(['--co', " ".join(GTIFF_COPT)])
-    cmd_args.append(expr_opt)
-    utils.executeCmd(cmd_args)
+        expr = 'A*B'
+    if gdal_calc_in_process:
+        applyGdalCalcInProcess({'A' : a_path, 'B' : b_path},out_path,expr)
+    else:
+        cmd_args = getGdalCalcCmd() + [
+                    '-A', a_path,
+                    '-B', b_path,
+                    #'--type=Int32',
+                    '--NoDataValue='+nodata_val,
+                    '--overwrite',
+                    '--outfile='+out_path]
+        for opt in GTIFF_COPT:
+            cmd_args.extend(['--co', opt])
+        cmd_args.append('--calc=' + expr)
+        utils.executeCmd(cmd_args)
     res_layer = qgsUtils.loadRasterLayer(out_path)
     QgsProject.instance().addMapLayer(res_layer)
     
+# Creates raster 'out_path' keeping minimum (is_min) or maximum value
+# from 'in_path1' and 'in_path2', with a single min/max kernel if in process.
+# Output is nodata where any input is nodata (in process and with gdal_calc).
+def applyMinMaxGdal(in_path1,in_path2,out_path,is_min,load_flag=False):
+    if os.path.isfile(out_path):
+        qgsUtils.removeRaster(out_path)
+    if gdal_calc_in_process and blockCalcOk([in_path1,in_path2],out_path):
+        kernel = getMinMaxKernel(is_min)
+        def calcMinMax(arrays,masks):
+            return kernel(*arrays)
+        applyBlockCalc([in_path1,in_path2],out_path,calcMinMax,
+            nodata_val=nodata_val,out_type=USE_LARGEST_TYPE,propagate_nodata=True)
+    else:
+        expr = 'minimum(A,B)' if is_min else 'maximum(A,B)'
+        runGdalCalcAB(in_path1,in_path2,out_path,expr)
+    if load_flag:
+        res_layer = qgsUtils.loadRasterLayer(out_path)
+        QgsProject.instance().addMapLayer(res_layer)
+
 # Creates raster 'out_path' keeping maximum value from 'in_path1' and 'in_path2'.
-# def applyMaxGdal(in_path1,in_path2,out_path,load_flag=False):
-    # utils.debug("qgsTreatments.applyMaxGdal")
-    # expr = 'B*less_equal(A,B) + A*less(B,A)'
-    # applyGdalCalcAB(in_path1,in_path2,out_path,expr,load_flag)
-    
-# Creates raster 'out_path' keeping maximum value from 'in_path1' and 'in_path2'.
-# def applyMinGdal(in_path1,in_path2,out_path,load_flag=False):
-    # utils.debug("qgsTreatments.applyMinGdal")
-    # expr = 'A*less_equal(A,B) + B*less(B,A)'
-    # applyGdalCalcAB(in_path1,in_path2,out_path,expr,load_flag)
+def applyMaxGdal(in_path1,in_path2,out_path,load_flag=False):
+    utils.debug("qgsTreatments.applyMaxGdal")
+    applyMinMaxGdal(in_path1,in_path2,out_path,False,load_flag)
+    
+# Creates raster 'out_path' keeping minimum value from 'in_path1' and 'in_path2'.
+def applyMinGdal(in_path1,in_path2,out_path,load_flag=False):
+    utils.debug("qgsTreatments.applyMinGdal")
+    applyMinMaxGdal(in_path1,in_path2,out_path,True,load_flag)
                  
         
+# Merges 'files' into Int32 raster 'out_path' ('nodata_val' pixels ignored).
+# With gdal_direct, files are stacked in a VRT then warped to output
+# on all cores, otherwise gdal_merge is called.
 def applyGdalMerge(files,out_path,load_flag=False):
+    if gdal_direct:
+        gt = qgsUtils.openRaster(files[0]).GetGeoTransform()
+        vrt_options = gdal.BuildVRTOptions(srcNodata=nodata_val,
+            VRTNodata=nodata_val,xRes=gt[1],yRes=abs(gt[5]))
+        with gdalTmpPath(".vrt") as vrt_path:
+            gdalCall(gdal.BuildVRT,vrt_path,files,vrt_options)
+            warp_options = gdal.WarpOptions(format='GTiff',
+                outputType=gdal.GDT_Int32,dstNodata=float(nodata_val),
+                multithread=True,warpOptions=['NUM_THREADS=ALL_CPUS'],
+                creationOptions=qgsUtils.getGTiffOptions(Qgis.Int32))
+            gdalCall(gdal.Warp,out_path,vrt_path,warp_options)
+        if load_flag:
+            res_layer = qgsUtils.loadRasterLayer(out_path)
+            QgsProject.instance().addMapLayer(res_layer)
+        return
     cmd_args = [gdal_merge_cmd,
                 '-o', out_path,
                 '-of', 'GTiff',
                 '-ot','Int32',
                 '-n', nodata_val,
-                '-a_nodata', nodata_val]
-    cmd_args.extend(['--co', " ".join(GTIFF_COPT)])
+                '-a_nodata', nodata_val,
+                '--config', 'GDAL_NUM_THREADS', 'ALL_CPUS']
+    for opt in GTIFF_COPT:
+        cmd_args.extend(['-co', opt])
     cmd_args += files
     utils.executeCmd(cmd_args)
     if load_flag:
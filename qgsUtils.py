@@ -24,6 +24,10 @@
 """
 
 import os, shutil
+import functools
+import threading
+import collections
+import contextlib
 from pathlib import Path
 import numpy as np
 
@@ -43,7 +47,45 @@ from . import utils
 if os.environ.get("GTIFF_COPT") is not None:
     GTIFF_COPT = os.environ["GTIFF_COPT"].split()
 else:
-    GTIFF_COPT = ["BIGTIFF=IF_SAFER", "COMPRESS=LZW", "NUM_THREADS=ALL_CPUS"]
+    GTIFF_COPT = ["BIGTIFF=IF_SAFER", "COMPRESS=LZW", "NUM_THREADS=ALL_CPUS",
+                  "TILED=YES", "BLOCKXSIZE=512", "BLOCKYSIZE=512"]
+
+# GDAL performance settings (multithreaded (de)compression, VSI read cache of
+# 100 MB, internal masks, no directory listing on open : sidecar files are
+# probed directly, which avoids listing large or remote directories for each
+# opened file).
+# They are not applied process wide at import since this library runs inside
+# QGIS (host layers must not be affected) : they are set as thread local
+# options around this library's own GDAL calls (gdalConfig).
+# Options already set (environment variable or GDAL configuration) are kept.
+GDAL_CONFIG = { "GDAL_NUM_THREADS" : "ALL_CPUS",
+                "VSI_CACHE" : "TRUE",
+                "VSI_CACHE_SIZE" : "100000000",
+                "GDAL_DISABLE_READDIR_ON_OPEN" : "TRUE",
+                "GDAL_TIFF_INTERNAL_MASK" : "YES" }
+# GDAL block cache size in MB (process wide, see setGdalConfig)
+GDAL_CACHEMAX = 512
+
+# Sets GDAL options 'config' for current thread inside 'with' block
+@contextlib.contextmanager
+def gdalConfig(config=GDAL_CONFIG):
+    keys = [k for k in config if gdal.GetConfigOption(k) is None]
+    for key in keys:
+        gdal.SetThreadLocalConfigOption(key,config[key])
+    try:
+        yield
+    finally:
+        for key in keys:
+            gdal.SetThreadLocalConfigOption(key,None)
+
+# Applies GDAL settings process wide (block cache size and 'config').
+# Opt-in, to be called by standalone scripts, not when running inside QGIS.
+def setGdalConfig(config=GDAL_CONFIG,cache_max=GDAL_CACHEMAX):
+    if gdal.GetConfigOption("GDAL_CACHEMAX") is None:
+        gdal.SetCacheMax(int(cache_max) * 1024 * 1024)
+    for key, val in config.items():
+        if gdal.GetConfigOption(key) is None:
+            gdal.SetConfigOption(key,val)
 
 
 def typeIsInteger(t):
@@ -62,6 +104,21 @@ def qgisTypeIsInteger(t):
     int_types = [Qgis.Byte, Qgis.UInt16, Qgis.Int16, Qgis.UInt32, Qgis.Int32]
     return (t in int_types)
     
+# Returns GeoTIFF creation options (GTIFF_COPT) for QGIS data type 'data_type'.
+# If compression is enabled, a predictor matching data type is added.
+def getGTiffOptions(data_type=None):
+    copt = list(GTIFF_COPT)
+    keys = [o.split('=')[0].upper() for o in copt]
+    if not isinstance(data_type,Qgis.DataType):
+        return copt
+    if 'COMPRESS' not in keys or 'PREDICTOR' in keys:
+        return copt
+    if data_type in [Qgis.Float32, Qgis.Float64]:
+        copt.append("PREDICTOR=3")
+    elif qgisTypeIsInteger(data_type) and data_type != Qgis.Byte:
+        copt.append("PREDICTOR=2")
+    return copt
+    
 def isVectorLayer(layer):
     return layer.type() == QgsMapLayer.VectorLayer
     
@@ -76,6 +133,7 @@ def removeFolder(path):
 def removeRaster(path):
     if isLayerLoaded(path):
         utils.user_error("Layer " + str(path) + " is already loaded in QGIS, please remove it")
+    clearRasterCache()
     utils.removeFile(path)
     aux_name = path + ".aux.xml"
     utils.removeFile(aux_name)
@@ -101,34 +159,113 @@ def layerNameOfPath(p):
     res = os.path.splitext(bn)[0]
     return res
     
+# File dialog filters of registered providers, computed on first call
+# (providers are registered at QGIS startup)
+vector_filters = None
+raster_filters = None
+
 def getVectorFilters():
-    return QgsProviderRegistry.instance().fileVectorFilters()
+    global vector_filters
+    if vector_filters is None:
+        vector_filters = QgsProviderRegistry.instance().fileVectorFilters()
+    return vector_filters
     
 def getRasterFilters():
-    return QgsProviderRegistry.instance().fileRasterFilters()
+    global raster_filters
+    if raster_filters is None:
+        raster_filters = QgsProviderRegistry.instance().fileRasterFilters()
+    return raster_filters
            
+# Index of project layers by path : { path key -> { layer id -> layer } },
+# built on first lookup and then updated by project signals, so that
+# path lookups do not scan all project layers.
+layers_index = None
+# { layer id -> path key } to unindex removed layers
+layers_index_keys = {}
+# Index of project layers by name, same structure, updated on layer renaming
+layers_names_index = {}
+layers_names_keys = {}
+
+# Key identifying layer path 'path' in layers_index : normalized string
+# (case insensitive, separators and '.' / '..' segments normalized), computed
+# once per layer when indexed and once per lookup.
+def layerPathKey(path):
+    return os.path.normpath(os.fspath(path).lower())
+    
+def addToIndex(index,index_keys,key,layer):
+    index.setdefault(key,{})[layer.id()] = layer
+    index_keys[layer.id()] = key
+    
+def removeFromIndex(index,index_keys,layer_id):
+    key = index_keys.pop(layer_id,None)
+    if key in index:
+        index[key].pop(layer_id,None)
+        if not index[key]:
+            del index[key]
+    
+def indexLayerName(layer):
+    removeFromIndex(layers_names_index,layers_names_keys,layer.id())
+    addToIndex(layers_names_index,layers_names_keys,layer.name(),layer)
+    
+def indexLayerPath(layer):
+    removeFromIndex(layers_index,layers_index_keys,layer.id())
+    if layer.dataProvider() is not None:
+        key = layerPathKey(pathOfLayer(layer))
+        addToIndex(layers_index,layers_index_keys,key,layer)
+    
+# Indexes 'layers' by path and name. Project layers are only listed once
+# (mapLayers) when index is built, then indexes follow project and layers
+# signals (added, removed, renamed or source changed).
+def indexLayers(layers):
+    for layer in layers:
+        indexLayerName(layer)
+        indexLayerPath(layer)
+        layer_id = layer.id()
+        def onNameChanged(layer=layer,layer_id=layer_id):
+            if layer_id in layers_names_keys:
+                indexLayerName(layer)
+        def onSourceChanged(layer=layer,layer_id=layer_id):
+            if layer_id in layers_names_keys:
+                indexLayerPath(layer)
+        layer.nameChanged.connect(onNameChanged)
+        # QGIS >= 3.6
+        if hasattr(layer,"dataSourceChanged"):
+            layer.dataSourceChanged.connect(onSourceChanged)
+        
+def unindexLayers(layer_ids):
+    for layer_id in layer_ids:
+        removeFromIndex(layers_index,layers_index_keys,layer_id)
+        removeFromIndex(layers_names_index,layers_names_keys,layer_id)
+    
+def getLayersIndex():
+    global layers_index
+    if layers_index is None:
+        layers_index = {}
+        project = QgsProject.instance()
+        indexLayers(project.mapLayers().values())
+        project.layersAdded.connect(indexLayers)
+        project.layersRemoved.connect(unindexLayers)
+    return layers_index
+           
+# Returns layer of file 'fname' loaded in QGIS project, None if not loaded
+def findLoadedLayer(fname):
+    layers = getLayersIndex().get(layerPathKey(fname))
+    if layers:
+        return next(iter(layers.values()))
+    return None
+    
 def getLayerByFilename(fname):
-    map_layers = QgsProject.instance().mapLayers().values()
-    fname_parts = Path(fname.lower()).parts
-    utils.debug("fname_parts : " + str(fname_parts))
-    for layer in map_layers:
-        # utils.debug("layer : " + str(layer.name()))
-        layer_path = pathOfLayer(layer)
-        path_parts = Path(layer_path.lower()).parts
-        # utils.debug("path_parts : " + str(path_parts))
-        if fname_parts == path_parts:
-            return layer
-    else:
-        return None
+    return findLoadedLayer(fname)
        
 def isLayerLoaded(fname):
-    return (getLayerByFilename(fname) != None)
+    return (findLoadedLayer(fname) is not None)
     
-def normalizeEncoding(layer):
-    path = pathOfLayer(layer)
+# Sets encoding of vector layer provider according to file extension.
+# Layer file path can be given if known (avoids provider URI parsing).
+def normalizeEncoding(layer,path=None):
+    if path is None:
+        path = pathOfLayer(layer)
     extension = os.path.splitext(path)[1].lower()
-    utils.debug("extension = " + str(extension))
-    utils.debug("system = " + str(utils.platform_sys))
     if extension == ".shp" and (utils.platform_sys in ["Linux","Darwin"]):
         layer.dataProvider().setEncoding('Latin-1')
     elif extension == ".shp":
@@ -153,15 +290,16 @@ def loadLayerInQGIS(layer,groupName=None):
 def loadVectorLayer(fname,loadProject=False,normalize=False,groupName=None):
     utils.debug("loadVectorLayer " + str(fname))
     utils.checkFileExists(fname)
-    if isLayerLoaded(fname):
-       return getLayerByFilename(fname)
+    existing = findLoadedLayer(fname)
+    if existing is not None:
+       return existing
     layer = QgsVectorLayer(fname, layerNameOfPath(fname), "ogr")
     if not layer:
         utils.user_error("Could not load vector layer '" + fname + "'")
     if not layer.isValid():
         utils.user_error("Invalid vector layer '" + fname + "'")
     if normalize:
-        normalizeEncoding(layer)
+        normalizeEncoding(layer,path=fname)
     if loadProject:
         loadLayerInQGIS(layer,groupName=groupName)
     return layer
@@ -171,8 +309,9 @@ def loadVectorLayer(fname,loadProject=False,normalize=False,groupName=None):
 def loadRasterLayer(fname,loadProject=False,groupName=None):
     utils.debug("loadRasterLayer " + str(fname))
     utils.checkFileExists(fname)
-    if isLayerLoaded(fname):
-        return getLayerByFilename(fname)
+    existing = findLoadedLayer(fname)
+    if existing is not None:
+        return existing
     rlayer = QgsRasterLayer(fname, layerNameOfPath(fname))
     if not rlayer.isValid():
         utils.user_error("Invalid raster layer '" + fname + "'")
@@ -199,7 +338,7 @@ def loadVectorLayerNoError(fname):
     if not layer.isValid():
         utils.debug("Invalid vector layer '" + fname + "'")
         return None
-    normalizeEncoding(layer)
+    normalizeEncoding(layer,path=fname)
     return layer
     
 def loadRasterLayerNoError(fname):
@@ -214,8 +353,9 @@ def loadRasterLayerNoError(fname):
     
 def loadLayer(fname,loadProject=False,groupName=None):
     utils.debug("loadLayer " + str(fname))
-    if isLayerLoaded(fname):
-        return getLayerByFilename(fname)
+    existing = findLoadedLayer(fname)
+    if existing is not None:
+        return existing
     layer = loadVectorLayerNoError(fname)
     if layer is None:
         layer = loadRasterLayerNoError(fname)
@@ -249,6 +389,9 @@ def loadLayer(fname,loadProject=False,groupName=None):
     
 def loadLayerGetType(fname,loadProject=False,groupName=None):
     utils.debug("loadLayerGetType " + str(fname))
+    existing = findLoadedLayer(fname)
+    if existing is not None:
+        return (existing, 'Vector' if isVectorLayer(existing) else 'Raster')
     layer = loadVectorLayerNoError(fname)
     type = 'Vector'
     if layer is None:
@@ -262,8 +405,8 @@ def loadLayerGetType(fname,loadProject=False,groupName=None):
     
 # Retrieve layer loaded in QGIS project from name
 def getLoadedLayerByName(name):
-    utils.debug("Layers = " + str([l.name() for l in QgsProject.instance().mapLayers().values()]))
-    layers = QgsProject.instance().mapLayersByName(name)
+    getLayersIndex()
+    layers = list(layers_names_index.get(name,{}).values())
     nb_layers = len(layers)
     if nb_layers == 0:
         utils.warn("No layer named '" + name + "' found")
@@ -278,7 +421,7 @@ def removeLayer(layer):
     inst.removeMapLayers( [layer.id()] )
 def removeLayerFromPath(layerPath):
     utils.debug("removeLayerFromPath" + str(layerPath))
-    layer = getLayerByFilename(layerPath)
+    layer = findLoadedLayer(layerPath)
     utils.debug("layer ZZ {}".format(layer))
     if layer:
         removeLayer(layer)
@@ -399,7 +542,7 @@ def checkLayersCompatible(l1,l2):
                     + "' not compatible with SRID '" + str(crs2)
                     + "' of layer " + l2.name())
     geomType1 = l1.geometryType()
-    geomType2 = l1.geometryType()
+    geomType2 = l2.geometryType()
     if geomType1 != geomType2:
         utils.user_error("Layer " + l1.name() + " geometry '" + str(geomType1)
                     + "' not compatible with geometry '" + str(geomType2)
@@ -429,7 +572,7 @@ def createLayerFromExisting(inLayer,outName,geomType=None,crs=None):
         geomType=getLayerGeomStr(inLayer)
     layerStr = geomType + '?crs='+crs
     utils.debug(layerStr)
-    outLayer=QgsVectorLayer(geomType + '?crs='+crs, outName, "memory")
+    outLayer=QgsVectorLayer(layerStr, outName, "memory")
     return outLayer
     
 # Writes file from existing QgsMapLayer
@@ -454,10 +597,33 @@ def writeVectorLayer(layer,outfname):
     else:
         utils.user_error("Unable to create file '" + outfname + "' : " + str(error_msg))
         
+# Extents and CRS of layer files, keyed by (path, modification time)
+extent_cache = {}
+
+# Returns (extent, crs) of layer file 'path'. Layer is loaded and its extent
+# computed (features scan for some vector formats) once until file is modified.
+def getExtentOfPath(path):
+    key = (utils.normPath(path), os.path.getmtime(path))
+    if key not in extent_cache:
+        layer = loadLayer(path)
+        extent_cache[key] = (QgsRectangle(layer.extent()), layer.crs())
+    extent, crs = extent_cache[key]
+    return QgsRectangle(extent), QgsCoordinateReferenceSystem(crs)
+    
+# Returns CRS of first layer of vector file 'path', read from OGR datasource
+# (no QGIS layer loaded nor extent computed). Invalid CRS if undefined.
+def getVectorCrsOfPath(path):
+    ds = gdal.OpenEx(str(path),gdal.OF_VECTOR)
+    if ds is None:
+        utils.user_error("Could not open vector path '" + str(path) + "'")
+    srs = ds.GetLayer(0).GetSpatialRef()
+    if srs is None:
+        return QgsCoordinateReferenceSystem()
+    return QgsCoordinateReferenceSystem.fromWkt(srs.ExportToWkt())
+        
 # Return bounding box coordinates as a list
 def coordsOfExtentPath(extent_path):
-    layer = loadLayer(extent_path)
-    extent = layer.extent()
+    extent, crs = getExtentOfPath(extent_path)
     x_min = extent.xMinimum()
     x_max = extent.xMaximum()
     y_min = extent.yMinimum()
@@ -465,9 +631,7 @@ def coordsOfExtentPath(extent_path):
     return [str(x_min),str(y_min),str(x_max),str(y_max)]
     
 def getExtentStrFromPath(extent_path,crs=None):
-    extent_layer = loadLayer(extent_path)
-    extent = extent_layer.extent()
-    crs = extent_layer.crs()
+    extent, crs = getExtentOfPath(extent_path)
     res = str(extent.xMinimum())
     res += ',' + str(extent.xMaximum())
     res += ',' + str(extent.yMinimum())
@@ -475,39 +639,117 @@ def getExtentStrFromPath(extent_path,crs=None):
     res += '[' + str(crs.authid()) + ']'
     return res
     
+# Returns hashable key of CRS 'crs' (authid, WKT if CRS has no authid)
+def crsKey(crs):
+    authid = crs.authid()
+    return ("authid", authid) if authid else ("wkt", crs.toWkt())
+    
+def crsFromKey(key):
+    kind, val = key
+    if kind == "authid":
+        return QgsCoordinateReferenceSystem(val)
+    return QgsCoordinateReferenceSystem.fromWkt(val)
+    
+transforms_cache_connected = False
+
+# Coordinate transforms are created once per (input, output) CRS pair
+# (PROJ pipeline initialization is costly). Cache is cleared when project
+# transform context (datum transformations) changes.
+@functools.lru_cache(maxsize=64)
+def getCoordinateTransformFromKeys(in_key,out_key):
+    return QgsCoordinateTransform(crsFromKey(in_key),crsFromKey(out_key),
+        QgsProject.instance())
+    
+def getCoordinateTransform(in_crs,out_crs):
+    global transforms_cache_connected
+    if not transforms_cache_connected:
+        transforms_cache_connected = True
+        QgsProject.instance().transformContextChanged.connect(
+            getCoordinateTransformFromKeys.cache_clear)
+    return getCoordinateTransformFromKeys(crsKey(in_crs),crsKey(out_crs))
+    
 def transformBoundingBox(in_rect,in_crs,out_crs):
-    transformator = QgsCoordinateTransform(in_crs,out_crs,QgsProject.instance())
+    transformator = getCoordinateTransform(in_crs,out_crs)
     out_rect = transformator.transformBoundingBox(in_rect)
     return out_rect
     
+# Returns feature request fetching only fields 'fieldnames' of 'layer'
+# (no geometry, other attributes not read)
+def fieldsRequest(layer,fieldnames):
+    req = QgsFeatureRequest()
+    req.setSubsetOfAttributes(fieldnames,layer.fields())
+    req.setFlags(QgsFeatureRequest.NoGeometry)
+    return req
+    
+# Attributes caches of vector layers : { layer id -> (cache, fieldnames) }.
+# Features are fetched once from provider and then served from memory to
+# successive attribute scans (different fields of same layer for instance).
+# Caches follow layer edits and are dropped when layer is deleted.
+layers_caches = {}
+# Layers with more features are not cached
+LAYER_CACHE_MAX_FEATURES = 100000
+
+# Returns features attributes cache of 'layer' including fields 'fieldnames'
+# (no geometry), None if layer is too big to be cached
+def getLayerCache(layer,fieldnames):
+    nb_feats = layer.featureCount()
+    if nb_feats < 0 or nb_feats > LAYER_CACHE_MAX_FEATURES:
+        return None
+    layer_id = layer.id()
+    entry = layers_caches.get(layer_id)
+    fieldnames = set(fieldnames)
+    if entry is not None:
+        if fieldnames <= entry[1]:
+            return entry[0]
+        fieldnames |= entry[1]
+    else:
+        layer.willBeDeleted.connect(lambda : layers_caches.pop(layer_id,None))
+    cache = QgsVectorLayerCache(layer,max(1,nb_feats))
+    cache.setCacheGeometry(False)
+    cache.setCacheSubsetOfAttributes([layer.fields().indexOf(f) for f in fieldnames])
+    cache.setFullCache(True)
+    layers_caches[layer_id] = (cache, fieldnames)
+    return cache
+    
+# Returns features of 'layer' with fields 'fieldnames' only (no geometry),
+# from layer attributes cache if possible
+def getFieldsFeatures(layer,fieldnames):
+    req = fieldsRequest(layer,fieldnames)
+    cache = getLayerCache(layer,fieldnames)
+    if cache is None:
+        return layer.getFeatures(req)
+    return cache.getFeatures(req)
+    
 def getLayerFieldUniqueValues(layer,fieldname):
     path = pathOfLayer(layer)
     fieldnames = layer.fields().names()
     if fieldname not in fieldnames:
         utils.internal_error("No field named '" + fieldname + "' in layer " + path)
+    idx = layer.fields().indexOf(fieldname)
     field_values = set()
-    for f in layer.getFeatures():
-        field_values.add(f[fieldname])
+    for f in getFieldsFeatures(layer,[fieldname]):
+        field_values.add(f[idx])
     return field_values
     
+# Returns dictionary { key_field value -> list of val_field values } of 'layer'
+# (values in order of first appearance, without duplicates)
 def getLayerAssocs(layer,key_field,val_field):
-    assoc = {}
+    # Values stored in dicts (ordered, O(1) membership), NULL variants
+    # being distinct objects they are identified by None
+    assoc = collections.defaultdict(dict)
     path = pathOfLayer(layer)
     fieldnames = layer.fields().names()
     if key_field not in fieldnames:
         utils.internal_error("No field named '" + key_field + "' in layer " + path)
     if val_field not in fieldnames:
         utils.internal_error("No field named '" + val_field + "' in layer " + path)
-    for f in layer.getFeatures():
-        k = f[key_field]
-        v = f[val_field]
-        if k in assoc:
-            old_v = assoc[k]
-            if v not in old_v:
-                old_v.append(v)
-        else:
-            assoc[k] = [v]
-    return assoc
+    key_idx = layer.fields().indexOf(key_field)
+    val_idx = layer.fields().indexOf(val_field)
+    for f in getFieldsFeatures(layer,[key_field,val_field]):
+        v = f[val_idx]
+        v_key = None if v == NULL else v
+        assoc[f[key_idx]].setdefault(v_key,v)
+    return { k : list(vals.values()) for k, vals in assoc.items() }
    
 """ Raster utilities """
    
@@ -515,7 +757,7 @@ def getLayerAssocs(layer,key_field,val_field):
 # Exports array to .tif file (path) according to rasterSource
 def exportRaster(array,rasterSource,path,
                  nodata=None,type=None,copt=GTIFF_COPT):
-    raster = gdal.Open(str(rasterSource))
+    raster = openRaster(rasterSource)
     rows = raster.RasterYSize
     cols = raster.RasterXSize
     raster_band1 = raster.GetRasterBand(1)
@@ -555,18 +797,149 @@ def exportRaster(array,rasterSource,path,
 
     band = outDs = None # Close writing
     
+# Opens raster file 'path' with GDAL (read-only)
+def openRasterNoCache(path):
+    with gdalConfig():
+        ds = gdal.Open(str(path),gdal.GA_ReadOnly)
+    if not ds:
+        utils.user_error("Could not open raster path '" + str(path) + "'")
+    return ds
+    
+# Datasets kept open between calls, keyed by (path, modification time, thread)
+# so that headers are parsed once and GDAL block cache stays relevant.
+# GDAL datasets must not be shared between threads, hence thread key.
+@functools.lru_cache(maxsize=32)
+def openRasterCached(path,mtime,thread_id):
+    return openRasterNoCache(path)
+    
+# Closes cached datasets, to be called before a raster file is written
+def clearRasterCache():
+    openRasterCached.cache_clear()
+    
+# Opens raster file 'path' with GDAL (read-only). Dataset is cached if 'cache'
+# (do not close or modify it).
+def openRaster(path,cache=True):
+    path = str(path)
+    if cache and os.path.isfile(path):
+        return openRasterCached(path,os.path.getmtime(path),threading.get_ident())
+    return openRasterNoCache(path)
+    
+# Minimal number of pixels read at once when iterating over raster blocks
+RASTER_WINDOW_SIZE = 1 << 20
+    
+# Yields windows (x_off, y_off, x_size, y_size) covering 'band', aligned on
+# its natural block size. Small blocks (e.g. striped GeoTIFF) are grouped.
+def iterRasterBlocks(band):
+    xsize, ysize = band.XSize, band.YSize
+    bx, by = band.GetBlockSize()
+    if bx * by < RASTER_WINDOW_SIZE:
+        by = max(by, (RASTER_WINDOW_SIZE // bx) // by * by)
+    for y in range(0,ysize,by):
+        h = min(by,ysize - y)
+        for x in range(0,xsize,bx):
+            yield (x, y, min(bx,xsize - x), h)
+            
+# Creates single band GeoTIFF 'path' with same grid as GDAL dataset 'ref_ds'
+def createRasterLike(ref_ds,path,type,nodata=None,copt=GTIFF_COPT):
+    clearRasterCache()
+    driver = gdal.GetDriverByName('GTiff')
+    with gdalConfig():
+        out_ds = driver.Create(str(path),ref_ds.RasterXSize,ref_ds.RasterYSize,
+                               1,type,copt)
+    if out_ds is None:
+        utils.internal_error("Could not create raster '" + str(path) + "'")
+    out_ds.SetGeoTransform(ref_ds.GetGeoTransform())
+    out_ds.SetProjection(ref_ds.GetProjection())
+    if nodata is not None:
+        out_ds.GetRasterBand(1).SetNoDataValue(nodata)
+    return out_ds
+    
+# Overview levels built by buildOverviews
+OVERVIEW_LEVELS = [2, 4, 8, 16, 32]
+
+# Builds internal overviews of GeoTIFF 'path' (levels smaller than one pixel
+# are skipped) so that reads at lower resolution use reduced images
+def buildOverviews(path,resampling="NEAREST",levels=OVERVIEW_LEVELS):
+    clearRasterCache()
+    ds = gdal.Open(str(path),gdal.GA_Update)
+    if ds is None:
+        utils.user_error("Could not open raster '" + str(path) + "' for update")
+    min_size = min(ds.RasterXSize,ds.RasterYSize)
+    levels = [l for l in levels if min_size // l >= 1]
+    if levels:
+        ds.BuildOverviews(resampling,levels)
+    ds = None
+    
+# Maximal value range of integer arrays whose values are counted
+# (np.bincount) instead of sorted in arrayUniqueVals
+BINCOUNT_MAX_RANGE = 1 << 16
+
+# Kernel returning bitmap (uint8 array of size 'size') of values found in
+# uint8/uint16 array, compiled with Numba (parallel scan) on first call.
+# None if Numba is not installed.
+seen_vals_kernel = None
+seen_vals_kernel_init = False
+
+def getSeenValsKernel():
+    global seen_vals_kernel, seen_vals_kernel_init
+    if not seen_vals_kernel_init:
+        seen_vals_kernel_init = True
+        if utils.numbaIsInstalled():
+            import numba
+            # Concurrent writes of same value 1 in bitmap are harmless
+            @numba.njit(parallel=True,nogil=True)
+            def seenValsKernel(a,size):
+                seen = np.zeros(size,np.uint8)
+                flat = a.ravel()
+                for i in numba.prange(flat.size):
+                    seen[flat[i]] = 1
+                return seen
+            seen_vals_kernel = seenValsKernel
+    return seen_vals_kernel
+    
+# Returns sorted unique values of numpy array 'arr' ('nodata' excluded).
+# Values of uint8/uint16 arrays are marked in a bitmap by a Numba kernel if
+# available. Values of integer arrays with small range are counted in a
+# single pass (no sort nor sorted copy of array), other arrays go through np.unique.
+def arrayUniqueVals(arr,nodata=None):
+    if arr.dtype in (np.uint8, np.uint16) and getSeenValsKernel() is not None:
+        seen = seen_vals_kernel(arr,1 << (8 * arr.dtype.itemsize))
+        if nodata is not None and not np.isnan(nodata) and 0 <= nodata < len(seen):
+            if nodata == int(nodata):
+                seen[int(nodata)] = 0
+        return np.nonzero(seen)[0]
+    if nodata is not None:
+        arr = arr[~np.isnan(arr)] if np.isnan(nodata) else arr[arr != nodata]
+    if arr.size > 0 and arr.dtype.kind in 'iu':
+        lo, hi = int(arr.min()), int(arr.max())
+        if hi - lo < BINCOUNT_MAX_RANGE:
+            counts = np.bincount((arr.astype(np.int64) - lo).ravel())
+            return np.nonzero(counts)[0] + lo
+    return np.unique(arr)
+    
+# Returns sorted unique values of GDAL band 'band' (nodata excluded).
+# Band is read block by block (see iterRasterBlocks) so that memory use does
+# not depend on raster size. Blocks go through GDAL block cache (GDAL default
+# size unless setGdalConfig has been called, settings are not set at import).
+def bandUniqueVals(band):
+    nodata = band.GetNoDataValue()
+    unique_vals = None
+    for (x, y, w, h) in iterRasterBlocks(band):
+        block_vals = arrayUniqueVals(band.ReadAsArray(x,y,w,h),nodata)
+        if unique_vals is None:
+            unique_vals = block_vals
+        else:
+            unique_vals = np.union1d(unique_vals,block_vals)
+    if unique_vals is None:
+        return np.array([])
+    return unique_vals
+    
 def getRasterValsFromPath(path):
-    gdal_layer = gdal.Open(path)
-    if not gdal_layer:
-        utils.user_error("Could not load raster " + str(path))
+    gdal_layer = openRaster(path)
     band1 = gdal_layer.GetRasterBand(1)
-    data_array = band1.ReadAsArray()
-    unique_vals = set(np.unique(data_array))
-    utils.debug("Unique values init : " + str(unique_vals))
     in_nodata_val = band1.GetNoDataValue()
     utils.debug("in_nodata_val = " + str(in_nodata_val))
-    if in_nodata_val in unique_vals:
-        unique_vals.remove(in_nodata_val)
+    unique_vals = set(bandUniqueVals(band1).tolist())
     utils.debug("Unique values : " + str(unique_vals))
     return unique_vals
     
@@ -576,7 +949,7 @@ def getRasterValsOld(layer):
     gdal_layer = gdal.Open(path)
     band1 = gdal_layer.GetRasterBand(1)
     data_array = band1.ReadAsArray()
-    unique_vals = set(np.unique(data_array))
+    unique_vals = set(arrayUniqueVals(data_array).tolist())
     utils.debug("Unique values init : " + str(unique_vals))
     in_nodata_val = int(band1.GetNoDataValue())
     utils.debug("in_nodata_val = " + str(in_nodata_val))
@@ -597,9 +970,7 @@ def getRasterValsBis(layer):
     return list(unique_values)
     
 def getRasterValsAndArray(path,nodata=None):
-    raster = gdal.Open(str(path))
-    if not raster:
-        utils.user_error("Could not open raster path '" + str(path) + "'")
+    raster = openRaster(path)
     if(raster.RasterCount==1):
         band = raster.GetRasterBand(1)
         if nodata == None:
@@ -609,7 +980,7 @@ def getRasterValsAndArray(path,nodata=None):
         except ValueError:
             utils.internal_error("Raster file is too big for processing. Please crop the file and try again.")
             return
-        classes = sorted(np.unique(array)) # get classes
+        classes = arrayUniqueVals(array).tolist() # get classes
         try:
             classes.remove(nodata)
         except ValueError:
@@ -618,9 +989,7 @@ def getRasterValsAndArray(path,nodata=None):
     else:
         utils.user_error("Multiband Rasters not implemented yet")
 def getRasterValsArrayND(path,nodata=None):
-    raster = gdal.Open(str(path))
-    if not raster:
-        utils.user_error("Could not open raster path '" + str(path) + "'")
+    raster = openRaster(path)
     if(raster.RasterCount==1):
         band = raster.GetRasterBand(1)
         if nodata == None:
@@ -630,7 +999,7 @@ def getRasterValsArrayND(path,nodata=None):
         except ValueError:
             utils.internal_error("Raster file is too big for processing. Please crop the file and try again.")
             return
-        classes = sorted(np.unique(array)) # get classes
+        classes = arrayUniqueVals(array).tolist() # get classes
         try:
             classes.remove(nodata)
         except ValueError:
@@ -652,10 +1021,35 @@ def getRasterStats(layer):
     stats = pr.bandStatistics(1,stats=QgsRasterBandStats.All)
     return stats
     
+# Raster (min, max) values cache, layer id -> (data provider, (min, max))
+raster_minmax_cache = {}
+# Data provider whose signals invalidate cache, by layer id
+raster_minmax_connected = {}
+
+# Removes cached values and connections of layer 'layer_id' (layer deleted)
+def forgetRasterMinMax(layer_id):
+    raster_minmax_cache.pop(layer_id,None)
+    raster_minmax_connected.pop(layer_id,None)
+
+# Returns (min, max) of first band of raster 'layer'. Only min/max statistics
+# are computed, values are cached until layer data provider is replaced,
+# its data changes or layer is deleted.
 def getRasterMinMax(layer):
-    stats = getRasterStats(layer)
-    min, max = stats.minimumValue, stats.maximumValue
-    return (min, max)
+    layer_id = layer.id()
+    pr = layer.dataProvider()
+    entry = raster_minmax_cache.get(layer_id)
+    if entry is not None and entry[0] is pr:
+        return entry[1]
+    # Signals are connected once per layer and per data provider
+    if layer_id not in raster_minmax_connected:
+        layer.willBeDeleted.connect(lambda : forgetRasterMinMax(layer_id))
+    if raster_minmax_connected.get(layer_id) is not pr:
+        pr.dataChanged.connect(lambda : raster_minmax_cache.pop(layer_id,None))
+        raster_minmax_connected[layer_id] = pr
+    stats = pr.bandStatistics(1,stats=QgsRasterBandStats.Min | QgsRasterBandStats.Max)
+    res = (stats.minimumValue, stats.maximumValue)
+    raster_minmax_cache[layer_id] = (pr, res)
+    return res
     
 def getRastersMinMax(layers):
     if not layers:
@@ -671,8 +1065,7 @@ def getRastersMinMax(layers):
         
     
 def getRasterMinMedMax(layer):
-    stats = getRasterStats(layer)
-    min, max = stats.minimumValue, stats.maximumValue
+    min, max = getRasterMinMax(layer)
     range = max - min
     half_range = range//2
     med = min + half_range
@@ -687,10 +1080,7 @@ def getRasterMinMedMax(layer):
     # pass
     
 def getVectorValsOld(layer,field_name):
-    field_values = set()
-    for f in layer.getFeatures():
-        field_values.add(f[field_name])
-    return sorted(field_values)
+    return sorted(getLayerFieldUniqueValues(layer,field_name))
     
 def getVectorVals(layer,field_name):
     idx = layer.dataProvider().fieldNameIndex(field_name)
@@ -706,24 +1096,18 @@ def checkProjectionUnit(layer):
 """ GPKG """ 
 
 # Geopackages 'fid'
+# Feature ids are listed by provider, no feature is fetched
 def getMaxFid(layer):
-    max = 1
-    for f in layer.getFeatures():
-        id = f["fid"]
-        id = f.id()
-        if id > max:
-            max = id
-    return max
+    return max(1,max(layer.allFeatureIds(),default=1))
     
+# Sets first field ('fid') of features to 1..N. Values are changed by a
+# single provider call (one transaction, no edit buffer or undo stack).
 def normFids(layer):
-    max_fid = 1
-    feats = layer.getFeatures()
-    layer.startEditing()
-    for f in feats:
-        layer.changeAttributeValue(f.id(),0,max_fid)
-        #f.setId(max_fid)
-        max_fid += 1
-    layer.commitChanges()
+    req = QgsFeatureRequest().setNoAttributes().setFlags(QgsFeatureRequest.NoGeometry)
+    changes = { f.id() : { 0 : max_fid }
+        for max_fid, f in enumerate(layer.getFeatures(req),start=1) }
+    if not layer.dataProvider().changeAttributeValues(changes):
+        utils.internal_error("Could not normalize fids of layer " + str(layer.name()))
 
 
 """ UI utilities """    
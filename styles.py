@@ -24,6 +24,7 @@
 """
 
 import random
+import numpy as np
 
 from PyQt5.QtGui import QColor
 from qgis.core import (QgsColorRampShader,
@@ -257,15 +258,47 @@ def setRendererUniqueValues(layer,fieldname):
 def getValuesFromLayer3(layer):
     return qgsUtils.getRasterMinMedMax(layer)
     
+# Number of histogram bins used to compute quantiles
+QUANTILE_HISTO_BINS = 256
+
+# Returns 'nb_classes' quantile values of first band of raster 'layer',
+# computed from a single histogram between 'min' and 'max'
+def getRasterQuantiles(layer,min,max,nb_classes=5):
+    if max <= min:
+        return [min]
+    histo = layer.dataProvider().histogram(1,QUANTILE_HISTO_BINS,min,max)
+    counts = np.array(histo.histogramVector,dtype=float)
+    if counts.sum() == 0:
+        return [min]
+    cdf = np.concatenate([[0],np.cumsum(counts) / counts.sum()])
+    edges = np.linspace(min,max,len(counts) + 1)
+    return np.interp(np.linspace(0,1,nb_classes),cdf,edges).tolist()
+    
+# Returns color ramp items of 'color_ramp' placed at raster quantiles
+def mkQuantileRampItems(layer,color_ramp,min,max,nb_classes=5):
+    vals = getRasterQuantiles(layer,min,max,nb_classes)
+    nb_vals = len(vals)
+    items = []
+    for i, v in enumerate(vals):
+        pos = i / (nb_vals - 1) if nb_vals > 1 else 0
+        items.append(QgsColorRampShader.ColorRampItem(v,color_ramp.color(pos),
+            str(round(v,2))))
+    return items
+    
 def mkRasterShader(layer,color_ramp,classif_mode=QgsColorRampShader.Continuous):
-    min, med, max = getValuesFromLayer3(layer)
+    min, max = qgsUtils.getRasterMinMax(layer)
     rasterShader = QgsRasterShader(minimumValue=min,maximumValue=max)
-    colorRamp = getRandomSingleColorRamp()
     if not color_ramp:
         utils.internal_error("Could not create color ramp")        
     colorRampShader = QgsColorRampShader(minimumValue=min,maximumValue=max,
         colorRamp=color_ramp,classificationMode=classif_mode)
-    colorRampShader.classifyColorRamp(band=1,input=layer.dataProvider())
+    if classif_mode == QgsColorRampShader.Quantile:
+        # Quantiles from one histogram (min/max stats already computed)
+        # instead of a new raster scan in classifyColorRamp
+        colorRampShader.setColorRampItemList(
+            mkQuantileRampItems(layer,color_ramp,min,max))
+    else:
+        colorRampShader.classifyColorRamp(band=1,input=layer.dataProvider())
     if colorRampShader.isEmpty():
         utils.internal_error("Empty color ramp shader")
     rasterShader.setRasterShaderFunction(colorRampShader)
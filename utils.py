@@ -37,6 +37,9 @@ import platform
 import glob
 import csv
 import re
+import json
+import inspect
+import functools
 
 file_dir = os.path.dirname(__file__)
 if file_dir not in sys.path:
@@ -236,6 +239,106 @@ def findFileFromDir(dir,fname):
         return res
     
 
+# MEMOIZATION UTILITIES
+
+# If True, functions decorated with memoizeFile are skipped when their output
+# file is up to date (same inputs files state, same arguments, same settings).
+# Opt-in : files modified in place with same size and time are not detected.
+memoize_flag = False
+memoize_suffix = ".key"
+
+# Returns state (path, modification time, size) of file 'path'
+def singleFileState(path):
+    stat = os.stat(path)
+    return [normPath(path), stat.st_mtime, stat.st_size]
+    
+# Returns paths of sidecar files of 'path' : files with same base name
+# (shapefile .dbf/.shx/.prj, GDAL .aux.xml, world files, ...) and SQLite
+# write-ahead log (GeoPackage '-wal'). Memoization keys are excluded.
+def sidecarFiles(path):
+    bn = os.path.splitext(path)[0]
+    res = glob.glob(glob.escape(bn) + ".*") + glob.glob(glob.escape(path) + "-wal")
+    return sorted(f for f in res if f != path and not f.endswith(memoize_suffix))
+    
+# Returns state of file 'path' and its sidecar files
+def fileState(path):
+    return [singleFileState(f) for f in [path] + sidecarFiles(path)]
+    
+# Returns memoization key of call, or None if an input is not a file
+def memoKey(func,bound,inputs,output,ignore,settings):
+    in_states = []
+    for name in inputs:
+        vals = bound.arguments.get(name)
+        if vals is None:
+            continue
+        if not isinstance(vals,(list,tuple)):
+            vals = [vals]
+        for v in vals:
+            if not isinstance(v,str) or not os.path.isfile(v):
+                return None
+            in_states.append(fileState(v))
+    args = { k : repr(v) for k, v in bound.arguments.items()
+        if k not in inputs and k != output and k not in ignore }
+    return { "func" : func.__module__ + "." + func.__qualname__,
+             "inputs" : in_states,
+             "args" : args,
+             "settings" : repr(settings()) if settings else None }
+    
+# Decorator skipping function call if output file (argument 'output') already
+# exists and has been produced by the same call : same argument values, same
+# input files (arguments 'inputs', file path or list of paths) state and same
+# module settings (values returned by 'settings' function, e.g. global
+# nodata value or creation options used by function).
+# Call key and result are stored in sidecar file '<output>.key', result is
+# returned when call is skipped. Files (and their sidecar files) are
+# identified by path, modification time and size (no content hashing).
+# Arguments 'ignore' are not part of key. Calls with 'load_flag' are not skipped.
+# Disabled unless 'memoize_flag' is set.
+def memoizeFile(inputs,output,ignore=("context","feedback","load_flag"),settings=None):
+    def decorator(func):
+        sig = inspect.signature(func)
+        @functools.wraps(func)
+        def wrapper(*args,**kwargs):
+            if not memoize_flag:
+                return func(*args,**kwargs)
+            bound = sig.bind(*args,**kwargs)
+            bound.apply_defaults()
+            out_path = bound.arguments.get(output)
+            if not isinstance(out_path,str) or bound.arguments.get("load_flag"):
+                return func(*args,**kwargs)
+            key = memoKey(func,bound,inputs,output,ignore,settings)
+            if key is None:
+                return func(*args,**kwargs)
+            key_path = out_path + memoize_suffix
+            if os.path.isfile(out_path) and os.path.isfile(key_path):
+                try:
+                    with open(key_path,encoding="utf-8") as f:
+                        prev_key = json.load(f)
+                except ValueError:
+                    prev_key = None
+                if prev_key is not None:
+                    prev_out = prev_key.pop("output",None)
+                    prev_res = prev_key.pop("result",None)
+                    if prev_key == key and prev_out == fileState(out_path):
+                        debug("Output '" + out_path + "' up to date, skipping "
+                            + func.__name__)
+                        return prev_res
+            removeFile(key_path)
+            res = func(*args,**kwargs)
+            if os.path.isfile(out_path):
+                key["output"] = fileState(out_path)
+                key["result"] = res
+                try:
+                    key_str = json.dumps(key)
+                except (TypeError, ValueError):
+                    # Result cannot be stored, call is never skipped
+                    return res
+                with open(key_path,"w",encoding="utf-8") as f:
+                    f.write(key_str)
+            return res
+        return wrapper
+    return decorator
+
 # TYPE UTILITIES
     
 def is_number(s):
@@ -362,4 +465,12 @@ def numpyIsInstalled():
         import_numpy_ok = True
     except ImportError as e:
         import_numpy_ok = False
-    return import_numpy_ok
\ No newline at end of file
+    return import_numpy_ok
+    
+def numbaIsInstalled():
+    try:
+        import numba
+        import_numba_ok = True
+    except ImportError as e:
+        import_numba_ok = False
+    return import_numba_ok